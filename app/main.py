@@ -1,15 +1,33 @@
-import json
 import asyncio
 import hashlib
 import time
 import os
-import glob
+import inspect
+import logging
+import logging.handlers
+from queue import SimpleQueue
+import tempfile
+import httpx
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from app.models import SearchConfig, CompanyAnalysis
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+from app.models import (
+    SearchConfig, CompanyAnalysis,
+    StatusEvent, ProgressEvent, CompanyResultEvent, MarketInsightsEvent, ErrorEvent, DoneEvent,
+    StreamEvent,
+)
 from async_lru import alru_cache
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
 # We will import services later as we implement them
 
 app = FastAPI(title="Intelligent Company Researcher")
@@ -29,74 +47,180 @@ async def root():
 from app.services.query_generator import generate_search_queries
 from app.services.search_service import execute_search
 from app.services.crawler_service import crawl_companies
-from app.services.analysis_service import analyze_single_company
+from app.services.analysis_service import (
+    analyze_single_company, discover_companies_with_gemini, enrich_company_with_gemini,
+    generate_market_insights, analyze_linkedin_company, close_llm_http, warm_tokenizer,
+)
+from app.services.linkedin_service import scrape_linkedin_companies, find_linkedin_urls
+from app.services.scraping_service import scrape_company_websites, close_scraper_http
+from app.services.apify_shared import close_apify_http
 
 # --- Cache Management ---
 
 OUTPUT_DIR = "output"
 CACHE_DURATION = 1800  # 30 minutes in seconds
+ANALYSIS_CONCURRENCY = 8  # max companies analyzed in parallel per request
+UPSTREAM_CONCURRENCY = 16  # max upstream LLM/Apify calls in flight across all requests
+STREAM_QUEUE_SIZE = 8  # max events buffered ahead of a slow SSE client
+STREAM_END = object()
+STREAM_EVENTS = TypeAdapter(list[StreamEvent])
 
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
-def get_cache_path(config: SearchConfig) -> str:
+@lru_cache(maxsize=256)
+def cache_path_for(config_json: str) -> str:
     # Generate a stable hash from the configuration
-    config_json = config.model_dump_json()
-    config_hash = hashlib.md5(config_json.encode()).hexdigest()
+    # (non-cryptographic key: xxh3 when available, BLAKE2b otherwise)
+    config_bytes = config_json.encode()
+    if xxhash:
+        config_hash = xxhash.xxh3_128_hexdigest(config_bytes)
+    else:
+        config_hash = hashlib.blake2b(config_bytes, digest_size=16).hexdigest()
     return os.path.join(OUTPUT_DIR, f"{config_hash}.json")
 
+def get_cache_path(config: SearchConfig) -> str:
+    # Identical configs (e.g. a user refreshing) reuse the memoized hash
+    return cache_path_for(config.model_dump_json())
+
+_last_cleanup = 0.0
+
 def cleanup_cache():
-    """Removes cache files older than CACHE_DURATION."""
+    """Removes cache files older than CACHE_DURATION (at most once per CACHE_DURATION/2)."""
+    global _last_cleanup
     now = time.time()
-    for f in glob.glob(os.path.join(OUTPUT_DIR, "*.json")):
-        if os.stat(f).st_mtime < now - CACHE_DURATION:
+    if now - _last_cleanup < CACHE_DURATION / 2:
+        return
+    _last_cleanup = now
+
+    cutoff = now - CACHE_DURATION
+    # scandir filters by name before any stat; entry.stat() is still one stat call per
+    # matching file on Linux (only is_dir/is_file come free from the listing)
+    with os.scandir(OUTPUT_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json") or entry.stat().st_mtime >= cutoff:
+                continue
             try:
-                os.remove(f)
-                print(f"Removed expired cache: {f}")
+                os.remove(entry.path)
+                print(f"Removed expired cache: {entry.path}")
             except OSError as e:
-                print(f"Error removing {f}: {e}")
+                print(f"Error removing {entry.path}: {e}")
+
+async def cache_cleanup_loop():
+    """Periodically purges expired cache files off the event loop."""
+    while True:
+        await asyncio.to_thread(cleanup_cache)
+        await asyncio.sleep(CACHE_DURATION)
+
+# --- Concurrency Control ---
+
+# Global cap on in-flight Gemini/Groq/Apify calls across all concurrent /research requests
+upstream_admission = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
 
 # --- Cached Wrappers ---
 
-@alru_cache(maxsize=32)
+@alru_cache(maxsize=32, ttl=CACHE_DURATION)
 async def cached_generate_queries(config_json: str):
     # wrapper to cache based on JSON string of config
     config = SearchConfig.model_validate_json(config_json)
     return await generate_search_queries(config)
 
-@alru_cache(maxsize=32)
+@alru_cache(maxsize=32, ttl=CACHE_DURATION)
 async def cached_search(queries_tuple):
     # wrapper to cache search results
     return await execute_search(list(queries_tuple))
 
-async def research_stream(config: SearchConfig):
+@dataclass(slots=True)
+class CompanyContext:
+    """Per-company inputs for Stage 4, resolved once after the fetch stages."""
+    company: dict
+    li_data: Optional[dict]
+    web_data: Optional[dict]
+
+async def collect_linkedin(linkedin_urls):
+    async with upstream_admission:
+        return [item async for item in scrape_linkedin_companies(linkedin_urls)]
+
+async def scrape_websites(website_urls, http_client):
+    """Returns scraped pages keyed by URL, indexed as each result streams in."""
+    # The internal crawler is local, so this stage takes no upstream slot
+    scraped_content_map = {}
+    async for item in scrape_company_websites(website_urls, client=http_client):
+        u = item.get('url')
+        if u: scraped_content_map[u] = item
+    return scraped_content_map
+
+def read_cached_events(cache_path: str):
+    """Returns the cached event list if the file exists and is fresh, else None."""
+    try:
+        if time.time() - os.stat(cache_path).st_mtime >= CACHE_DURATION:
+            return None
+        with open(cache_path, "rb") as f:
+            return STREAM_EVENTS.validate_json(f.read())
+    except (OSError, ValueError):
+        return None
+
+def write_cached_events(cache_path: str, events: list):
+    # Write-then-rename so readers never see a partial file; the temp name is unique
+    # so concurrent writers of the same config don't clobber each other
+    f = tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_path), suffix=".tmp", delete=False)
+    try:
+        with f:
+            f.write(STREAM_EVENTS.dump_json(events))
+        os.replace(f.name, cache_path)
+    except BaseException:
+        try:
+            os.unlink(f.name)
+        except OSError:
+            pass
+        raise
+
+async def research_events(config: SearchConfig, http_client: httpx.AsyncClient):
+    """
+    Replays a fresh on-disk result for an identical config, otherwise runs the
+    pipeline and persists its events once it completes successfully.
+    """
+    cache_path = get_cache_path(config)
+    cached_events = await asyncio.to_thread(read_cached_events, cache_path)
+    if cached_events is not None:
+        for event in cached_events:
+            yield event
+        return
+
+    events = []
+    async for event in run_research(config, http_client):
+        events.append(event)
+        yield event
+
+    if any(isinstance(e, CompanyResultEvent) for e in events) and not any(isinstance(e, ErrorEvent) for e in events):
+        try:
+            await asyncio.to_thread(write_cached_events, cache_path, events)
+        except OSError as e:
+            print(f"Error writing cache {cache_path}: {e}")
+
+async def run_research(config: SearchConfig, http_client: httpx.AsyncClient):
     """
     Generator function for SSE with Two-Stage Deep Research.
+    Yields typed event models; the transport layer handles serialization.
     """
     try:
-        cleanup_cache() 
-        cache_path = get_cache_path(config)
-        
-        yield f"data: {json.dumps({'type': 'status', 'message': 'Starting Deep Company Research...'})}\n\n"
+        yield StatusEvent(message='Starting Deep Company Research...')
         
-        from app.services.analysis_service import discover_companies_with_gemini, enrich_company_with_gemini, generate_market_insights, analyze_linkedin_company
-        from app.services.linkedin_service import scrape_linkedin_companies, find_linkedin_urls
-        from app.services.scraping_service import scrape_company_websites
-
         # 1. Discovery
-        yield f"data: {json.dumps({'type': 'status', 'message': 'Discovering companies (Strict Domain Filter)...'})}\n\n"
-        companies = await discover_companies_with_gemini(config, limit=10)
+        yield StatusEvent(message='Discovering companies (Strict Domain Filter)...')
+        async with upstream_admission:
+            companies = await discover_companies_with_gemini(config, limit=10)
         
         if not companies:
-             yield f"data: {json.dumps({'type': 'status', 'message': 'No companies found. Try broader keywords.'})}\n\n"
-             yield f"data: {json.dumps({'type': 'done'})}\n\n"
+             yield StatusEvent(message='No companies found. Try broader keywords.')
+             yield DoneEvent()
              return
 
         print(f"DEBUG: Discovered {len(companies)} companies: {[c['name'] for c in companies]}", flush=True)
-        yield f"data: {json.dumps({'type': 'status', 'message': f'Identified {len(companies)} candidates. Fetching Data...'})}\n\n"
+        yield StatusEvent(message=f'Identified {len(companies)} candidates. Fetching Data...')
 
-        # 2. LinkedIn Scraping (Parallel)
-        yield f"data: {json.dumps({'type': 'status', 'message': 'Scraping LinkedIn Profiles (Apify)...'})}\n\n"
+        # 2. LinkedIn URL Discovery
+        yield StatusEvent(message='Scraping LinkedIn Profiles (Apify)...')
         
         # Prepare LinkedIn URLs (Use what we have or guess/search if missing - for now assuming discovery might miss them)
         # In a real scenario, we might need a step to find LinkedIn URLs if discovery didn't provide them.
@@ -104,68 +228,71 @@ async def research_stream(config: SearchConfig):
         # User said "get linkedin data from linkedin actor... and use our internal scraper for scraping companies official website".
         
         # We need LinkedIn URLs to use the actor.
-        linkedin_urls_to_scrape = []
-        company_map = {c['name']: c for c in companies}
+        # One pass: collect known LinkedIn URLs (de-duplicated) and the companies still missing one.
+        linkedin_urls_to_scrape: set[str] = set()
+        missing_linkedin = []
+        company_map = {}
+        for c in companies:
+            company_map[c['name']] = c
+            url = c.get('url', '')
+            if 'linkedin.com/company' in url:
+                linkedin_urls_to_scrape.add(url)
+            elif c.get('linkedin_url'):
+                linkedin_urls_to_scrape.add(c['linkedin_url'])
+            elif 'linkedin' not in url.lower():
+                missing_linkedin.append(c['name'])
         
         # Simple heuristic: If we don't have a linkedIn URL, we might need to search it.
-        # For this iteration, we'll try to use the name to find it via Apify or skip.
-        # Let's try to find them if missing.
-        missing_linkedin = [c['name'] for c in companies if 'linkedin' not in c.get('url', '').lower()]
-        
         if missing_linkedin:
              print(f"DEBUG: Finding LinkedIn URLs for {len(missing_linkedin)} companies...", flush=True)
-             found_urls = await find_linkedin_urls(missing_linkedin) # This uses Apify Google Search
+             async with upstream_admission:
+                 found_urls = await find_linkedin_urls(missing_linkedin) # This uses Apify Google Search
              for name, url in found_urls.items():
                  if name in company_map:
                      company_map[name]['linkedin_url'] = url
-                     linkedin_urls_to_scrape.append(url)
+                     linkedin_urls_to_scrape.add(url)
         
-        # Also add existing ones
-        for c in companies:
-            if 'linkedin.com/company' in c.get('url', ''):
-                linkedin_urls_to_scrape.append(c['url'])
-            elif c.get('linkedin_url'):
-                linkedin_urls_to_scrape.append(c['linkedin_url'])
+        # 3. Internal Website Scraping -- runs concurrently with the LinkedIn scrape
+        yield StatusEvent(message='Scraping Official Websites (Internal Crawler)...')
         
+        website_urls = [c['url'] for c in companies if 'linkedin' not in c['url']]
+        linkedin_results, scraped_content_map = await asyncio.gather(
+            collect_linkedin(list(linkedin_urls_to_scrape)),
+            scrape_websites(website_urls, http_client),
+        )
+
         linkedin_data_map = {}
-        if linkedin_urls_to_scrape:
-            linkedin_results = await scrape_linkedin_companies(list(set(linkedin_urls_to_scrape)))
-            # Map back to company
-            # heuristic matching or by URL
-            for item in linkedin_results:
-                # Store by URL or Name
-                url = item.get('url') or item.get('linkedinUrl')
-                if url: linkedin_data_map[url] = item
-                name = item.get('name') or item.get('companyName')
-                if name: linkedin_data_map[name] = item
+        # Map back to company
+        # heuristic matching or by URL
+        for item in linkedin_results:
+            # Store by URL or Name
+            url = item.get('url') or item.get('linkedinUrl')
+            if url: linkedin_data_map[url] = item
+            name = item.get('name') or item.get('companyName')
+            if name: linkedin_data_map[name] = item
 
         print(f"DEBUG: LinkedIn Data Count: {len(linkedin_data_map)}", flush=True)
 
-        # 3. Internal Website Scraping (Parallel)
-        yield f"data: {json.dumps({'type': 'status', 'message': 'Scraping Official Websites (Internal Crawler)...'})}\n\n"
-        
-        website_urls = [c['url'] for c in companies if 'linkedin' not in c['url']]
-        scraped_content_map = {}
-        
-        if website_urls:
-            raw_scraped_data = await scrape_company_websites(website_urls)
-            for item in raw_scraped_data:
-                u = item.get('url')
-                if u: scraped_content_map[u] = item
-        
         print(f"DEBUG: Internal Scraped Pages: {len(scraped_content_map)}", flush=True)
 
-        # 4. Analysis & Synthesis
+        # 4. Analysis & Synthesis (concurrent, bounded)
         completed_count = 0
-        final_results = []
-        
-        for c in companies:
-            yield f"data: {json.dumps({'type': 'status', 'message': f'Analyzing {c["name"]}...'})}\n\n"
-            
-            # Combine Data
-            li_data = linkedin_data_map.get(c.get('linkedin_url')) or linkedin_data_map.get(c['name'])
-            web_data = scraped_content_map.get(c['url'])
-            
+        final_results: list[CompanyAnalysis] = []
+        analysis_slots = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+
+        # Combine Data: resolve each company's LinkedIn/website data once, up front
+        contexts = [
+            CompanyContext(
+                company=c,
+                li_data=linkedin_data_map.get(c.get('linkedin_url')) or linkedin_data_map.get(c['name']),
+                web_data=scraped_content_map.get(c['url']),
+            )
+            for c in companies
+        ]
+
+        async def analyze_one(ctx: CompanyContext):
+            c, li_data, web_data = ctx.company, ctx.li_data, ctx.web_data
+            # Slots are taken per LLM stage, not held across the whole company
             # Pass to Analysis Service
             # We'll need a new method or modify existing to accept this composite data
             # For now, we'll patch it into the existing flow or create a merged context
@@ -175,7 +302,8 @@ async def research_stream(config: SearchConfig):
             # Prefer LinkedIn data for "Firmographics" and Web data for "Content"
             if li_data:
                 # Use Gemini to analyze LinkedIn Data
-                analysis = await analyze_linkedin_company(li_data, config)
+                async with analysis_slots, upstream_admission:
+                    analysis = await analyze_linkedin_company(li_data, config)
             
             if not analysis and web_data:
                  # Fallback to web analysis if no LinkedIn
@@ -185,38 +313,167 @@ async def research_stream(config: SearchConfig):
             
             if not analysis:
                  # Fallback to Gemini Knowledge
-                 analysis = await enrich_company_with_gemini(c, config)
+                 async with analysis_slots, upstream_admission:
+                     analysis = await enrich_company_with_gemini(c, config)
             
             # Enforce "Website" is the official one, not LinkedIn
             if analysis and c.get('url') and 'linkedin' not in c['url']:
-                analysis.website = c['url']
+                analysis = analysis.model_copy(update={'website': c['url']})
+
+            return c, analysis
 
-            if analysis:
-                completed_count += 1
-                final_results.append(analysis.model_dump())
-                yield f"data: {json.dumps({'type': 'company_result', 'data': analysis.model_dump()})}\n\n"
-                yield f"data: {json.dumps({'type': 'progress', 'current': completed_count, 'total': len(companies)})}\n\n"
+        yield StatusEvent(message=f'Analyzing {len(companies)} companies...')
+
+        # Stream each result as soon as it completes instead of waiting for the whole batch
+        analysis_tasks = [asyncio.create_task(analyze_one(ctx)) for ctx in contexts]
+        try:
+            for next_done in asyncio.as_completed(analysis_tasks):
+                c, analysis = await next_done
+                if analysis:
+                    completed_count += 1
+                    final_results.append(analysis)
+                    yield CompanyResultEvent(data=analysis)
+                    yield ProgressEvent(current=completed_count, total=len(companies))
+        finally:
+            # Free upstream LLM slots right away if the client went away mid-stream
+            for task in analysis_tasks:
+                task.cancel()
 
         # 5. Market Insights
         if final_results:
-             yield f"data: {json.dumps({'type': 'status', 'message': 'Generating Final Market Insights...'})}\n\n"
-             # Convert dicts back to objects for the insight generator
-             analysis_objects = [CompanyAnalysis(**r) for r in final_results]
-             insights = await generate_market_insights(analysis_objects)
-             yield f"data: {json.dumps({'type': 'market_insights', 'data': insights})}\n\n"
+             yield StatusEvent(message='Generating Final Market Insights...')
+             async with upstream_admission:
+                 insights = await generate_market_insights(final_results)
+             yield MarketInsightsEvent(data=insights)
 
-        yield f"data: {json.dumps({'type': 'status', 'message': 'Research completed.'})}\n\n"
-        yield f"data: {json.dumps({'type': 'done'})}\n\n"
+        yield StatusEvent(message='Research completed.')
+        yield DoneEvent()
 
     except Exception as e:
         print(f"Stream error: {e}")
         import traceback
         traceback.print_exc()
-        yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+        yield ErrorEvent(message=str(e))
+
+async def produce_events(config: SearchConfig, http_client: httpx.AsyncClient, queue: asyncio.Queue):
+    try:
+        async for event in research_events(config, http_client):
+            await queue.put(event)  # blocks while the client is STREAM_QUEUE_SIZE events behind
+    except Exception as e:
+        # Still end the stream below, or the consumer would wait on the queue forever
+        print(f"Stream producer error: {e}")
+    await queue.put(STREAM_END)
+
+async def research_batches(config: SearchConfig, http_client: httpx.AsyncClient):
+    """
+    Drains a bounded queue fed by research_events so a slow client applies
+    backpressure instead of growing an in-memory buffer. Each batch holds every
+    event already produced; only the StreamingResponse fallback (encode_sse) sends
+    a batch as one write, the fastapi.sse path still writes one frame per event.
+    """
+    queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    producer = asyncio.create_task(produce_events(config, http_client, queue))
+    try:
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch[-1] is STREAM_END:
+                if len(batch) > 1:
+                    yield batch[:-1]
+                return
+            yield batch
+    finally:
+        producer.cancel()
+
+async def research_stream(config: SearchConfig, http_client: httpx.AsyncClient):
+    """
+    SSE generator yielding one event model at a time, for fastapi.sse. FastAPI
+    writes each yielded item as its own frame, so batches are not coalesced here.
+    """
+    async for batch in research_batches(config, http_client):
+        for event in batch:
+            yield event
+
+# --- Lifecycle ---
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    Routes log records through a queue so a listener thread does the actual writes
+    and logging never blocks the event loop. Returns the started listener.
+    """
+    log_queue = SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(log_queue)])
+    listener.start()
+    return listener
+
+@app.on_event("startup")
+async def startup():
+    app.state.log_listener = setup_logging()
+    # An async generator keeps Starlette from iterating the stream in its threadpool
+    if not inspect.isasyncgenfunction(research_stream):
+        raise RuntimeError("research_stream must be an async generator")
+    app.state.cache_cleanup_task = asyncio.create_task(cache_cleanup_loop())
+    await warm_tokenizer()
+    # One pooled client for the whole app: keep-alive connections are reused across requests
+    app.state.http = httpx.AsyncClient(
+        timeout=60.0,
+        limits=httpx.Limits(max_connections=128, max_keepalive_connections=16, keepalive_expiry=30),
+    )
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.cache_cleanup_task.cancel()
+    await app.state.http.aclose()
+    await close_llm_http()
+    await close_scraper_http()
+    await close_apify_http()
+    # Flushes queued records before the process exits
+    app.state.log_listener.stop()
+
+# --- SSE Transport ---
+
+@lru_cache(maxsize=1)
+def sse_support():
+    """Returns (EventSourceResponse, ServerSentEvent) if this FastAPI ships fastapi.sse, else None."""
+    try:
+        from fastapi.sse import EventSourceResponse, ServerSentEvent
+    except ImportError:
+        return None
+    return EventSourceResponse, ServerSentEvent
+
+# Pre-built frames for the two fixed-shape event types (same bytes pydantic would emit)
+PROGRESS_FRAME = b'data: {"type":"progress","current":%d,"total":%d}\n\n'
+STATUS_FRAME_PREFIX = b'data: {"type":"status","message":'
+
+def encode_event(event) -> bytes:
+    event_type = type(event)
+    if event_type is ProgressEvent:
+        return PROGRESS_FRAME % (event.current, event.total)
+    if event_type is StatusEvent:
+        return STATUS_FRAME_PREFIX + to_json(event.message) + b"}\n\n"
+    return b"data: " + to_json(event) + b"\n\n"
+
+async def encode_sse(config: SearchConfig, http_client: httpx.AsyncClient):
+    # Fallback framing for plain StreamingResponse: one pre-encoded bytes chunk per batch,
+    # so back-to-back frames share a single transport write
+    async for batch in research_batches(config, http_client):
+        yield b"".join(map(encode_event, batch))
+
+if sse_support():
+    EventSourceResponse, ServerSentEvent = sse_support()
 
-@app.post("/research")
-async def research_companies(config: SearchConfig):
-    return StreamingResponse(research_stream(config), media_type="text/event-stream")
+    @app.post("/research", response_class=EventSourceResponse)
+    async def research_companies(config: SearchConfig):
+        # pydantic-core serializes each event; FastAPI adds keep-alive pings and no-buffering headers.
+        # One write per event: frame coalescing only happens in the StreamingResponse fallback
+        async for event in research_stream(config, app.state.http):
+            yield ServerSentEvent(data=event)
+else:
+    @app.post("/research")
+    async def research_companies(config: SearchConfig):
+        return StreamingResponse(encode_sse(config, app.state.http), media_type="text/event-stream")
 
 @app.get("/ping")
 async def ping():
@@ -1,9 +1,15 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+import msgspec
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated, List, Literal, Optional, Union
+
+# Request/response models are immutable once validated; unknown keys (e.g. extra LLM output) are dropped
+FROZEN_CONFIG = ConfigDict(frozen=True, extra='ignore')
 
 # --- Configuration Models ---
 
 class SearchConfig(BaseModel):
+    model_config = FROZEN_CONFIG
+
     included_industries: List[str] = Field(..., description="List of industries to include")
     excluded_industries: Optional[List[str]] = Field(default=[], description="List of industries to exclude")
     required_keywords: List[str] = Field(..., description="Keywords that must be present")
@@ -16,25 +22,30 @@ class SearchConfig(BaseModel):
     required_product_categories: Optional[List[str]] = Field(default=[], description="Specific product categories required")
 
 # --- Intermediate Data Models ---
+# Internal carriers built per search result / scraped page; they never cross the HTTP
+# boundary, so they are msgspec Structs (slotted, cheap to build) rather than Pydantic models.
 
-class CompanyBasicInfo(BaseModel):
+class CompanyBasicInfo(msgspec.Struct, frozen=True):
     name: str
     url: str
     snippet: Optional[str] = None
     location: Optional[str] = None
     source: str = "search_result"
 
-class ScrapedContent(BaseModel):
+class ScrapedContent(msgspec.Struct, frozen=True):
     url: str
     html_content: Optional[str] = None
     text_content: Optional[str] = None
     meta_description: Optional[str] = None
     page_title: Optional[str] = None
-    sub_pages: dict = Field(default_factory=dict, description="Content from sub-pages like About, Contact")
+    # Content from sub-pages like About, Contact
+    sub_pages: dict[str, str] = msgspec.field(default_factory=dict)
 
 # --- Analysis Models (Output) ---
 
 class CompanyAnalysis(BaseModel):
+    model_config = FROZEN_CONFIG
+
     company_name: str
     website: str
     industry_match: bool
@@ -54,3 +65,34 @@ class CompanyAnalysis(BaseModel):
     founded_year: Optional[int] = None
     specialties: List[str] = []
     relevance_score: int = Field(..., description="Score from 0-100 indicating fit with requirements")
+
+# --- Stream Event Models (SSE payloads) ---
+
+class StatusEvent(BaseModel):
+    type: Literal["status"] = "status"
+    message: str
+
+class ProgressEvent(BaseModel):
+    type: Literal["progress"] = "progress"
+    current: int
+    total: int
+
+class CompanyResultEvent(BaseModel):
+    type: Literal["company_result"] = "company_result"
+    data: CompanyAnalysis
+
+class MarketInsightsEvent(BaseModel):
+    type: Literal["market_insights"] = "market_insights"
+    data: str
+
+class ErrorEvent(BaseModel):
+    type: Literal["error"] = "error"
+    message: str
+
+class DoneEvent(BaseModel):
+    type: Literal["done"] = "done"
+
+StreamEvent = Annotated[
+    Union[StatusEvent, ProgressEvent, CompanyResultEvent, MarketInsightsEvent, ErrorEvent, DoneEvent],
+    Field(discriminator="type"),
+]
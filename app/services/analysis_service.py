@@ -1,96 +1,554 @@
 import os
-from google import genai
-import json
+import httpx
+import orjson
 import asyncio
+import random
+import re
 import time
+from contextlib import aclosing
+from functools import lru_cache
+from importlib.util import find_spec
+from aiolimiter import AsyncLimiter
 from app.models import CompanyAnalysis, ScrapedContent, SearchConfig
-from typing import List, Optional
+from app.services.llm_cache import llm_cache
+from app.services.url_utils import host_of
+from typing import AsyncIterator, List, Optional
 from dotenv import load_dotenv
 
 try:
-    from groq import Groq
+    import ijson
 except ImportError:
-    Groq = None
+    ijson = None
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 load_dotenv()
 
 # --- Initialize Gemini ---
 api_key = os.getenv("GEMINI_API_KEY")
-client = None
-if api_key:
-    client = genai.Client(api_key=api_key)
+GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}"
 
 # --- Initialize Groq ---
 groq_api_key = os.getenv("GROQ_API_KEY")
-groq_client = None
-if groq_api_key and Groq:
-    groq_client = Groq(api_key=groq_api_key)
-
-# Global semaphore to limit concurrent Gemini API calls
-gemini_semaphore = asyncio.Semaphore(1) 
-
-async def call_llm(prompt: str) -> Optional[str]:
+GROQ_MODEL = "llama-3.3-70b-versatile"
+GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+# Both providers are called over REST on one pooled client (HTTP/2 when h2 is installed),
+# so in-flight calls share connections instead of each holding a worker thread
+_HTTP = httpx.AsyncClient(
+    http2=find_spec("h2") is not None,
+    timeout=60.0,
+    limits=httpx.Limits(max_connections=256),
+)
+
+async def close_llm_http():
+    await _HTTP.aclose()
+
+# Global token bucket sized to the Gemini RPM quota: refills at GEMINI_RPM/min, bursts up to GEMINI_BURST
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "60"))
+GEMINI_BURST = 10
+gemini_limiter = AsyncLimiter(GEMINI_BURST, time_period=60 * GEMINI_BURST / GEMINI_RPM)
+
+# Backoff on 429 / RESOURCE_EXHAUSTED before handing the prompt to Groq
+GEMINI_MAX_RETRIES = 3
+GEMINI_BACKOFF_BASE = 1.0  # seconds
+GEMINI_BACKOFF_CAP = 20.0  # seconds
+
+# Companies per analyze_companies LLM request
+ANALYSIS_BATCH_SIZE = 8
+
+# Stop streaming URL extraction once this many valid candidates are parsed
+MAX_STREAMED_CANDIDATES = 30
+
+# --- Response Cleanup ---
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.MULTILINE)
+
+def _strip_fences(s: str) -> str:
+    """Removes markdown code fences (```json ... ```) around an LLM response."""
+    return _FENCE_RE.sub('', s).strip()
+
+# --- Token Budgets ---
+# Prompt context is truncated by tokens rather than characters
+PAGE_TEXT_TOKENS = 400
+SUB_PAGE_TOKENS = 125
+LINKEDIN_ABOUT_TOKENS = 1250
+LISTICLE_TEXT_TOKENS = 5000
+CHARS_PER_TOKEN = 4  # rough estimate when no tokenizer is available
+
+_ENCODING = None
+_encoding_load: Optional[asyncio.Future] = None
+
+def _load_encoding():
+    # Only a successful load is kept; after a failure the next call tries again
+    global _ENCODING
+    if _ENCODING is None and tiktoken is not None:
+        try:
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"WARN: Tokenizer unavailable ({e}). Truncating by characters.", flush=True)
+    return _ENCODING
+
+def _start_encoding_load() -> asyncio.Future:
+    # At most one load in flight; must be called from the event loop
+    global _encoding_load
+    if _encoding_load is None or _encoding_load.done():
+        _encoding_load = asyncio.ensure_future(asyncio.to_thread(_load_encoding))
+    return _encoding_load
+
+async def warm_tokenizer():
+    """Loads the tokenizer in a worker thread; tiktoken may have to fetch the BPE file on first use."""
+    if _ENCODING is None and tiktoken is not None:
+        await asyncio.shield(_start_encoding_load())
+
+def _trunc(s: str, n_tokens: int) -> str:
+    """Truncates text to at most n_tokens tokens (by characters until the tokenizer is loaded)."""
+    if len(s) <= n_tokens:
+        return s  # every token covers at least one character
+    enc = _ENCODING
+    if enc is None:
+        if tiktoken is not None:
+            _start_encoding_load()  # never load on the event loop; later calls pick it up
+        return s[:n_tokens * CHARS_PER_TOKEN]
+    # Only encode a generous character prefix, not the whole page
+    head = s[:n_tokens * CHARS_PER_TOKEN * 4]
+    ids = enc.encode(head, disallowed_special=())
+    return head if len(ids) <= n_tokens else enc.decode(ids[:n_tokens])
+
+# --- Keyword Prefilter ---
+
+@lru_cache(maxsize=32)
+def _keyword_matcher(terms: tuple):
+    """Builds (once per term set) a predicate telling whether lowercased text contains any term."""
+    if ahocorasick:
+        automaton = ahocorasick.Automaton()
+        for term in terms:
+            automaton.add_word(term, term)
+        automaton.make_automaton()
+        return lambda text: next(automaton.iter(text), None) is not None
+    pattern = re.compile("|".join(map(re.escape, sorted(terms, key=len, reverse=True))))
+    return lambda text: pattern.search(text) is not None
+
+def keyword_prefilter(config: SearchConfig):
+    """Returns a predicate over ScrapedContent, or None when the config has no terms to match."""
+    terms = tuple(sorted({t.strip().lower() for t in config.required_keywords + config.included_industries if t.strip()}))
+    if not terms:
+        return None
+    matches = _keyword_matcher(terms)
+
+    def page_matches(content: ScrapedContent) -> bool:
+        texts = [content.page_title, content.meta_description, content.text_content, *content.sub_pages.values()]
+        return matches("\n".join(t for t in texts if t).lower())
+
+    return page_matches
+
+# --- URL Extraction Fallback ---
+_URL_RE = re.compile(r'https?://[^\s<>"\'\)\]\}]+')
+_EXCLUDED = (
+    "linkedin.com", "facebook.com", "twitter.com", "instagram.com", "youtube.com", 
+    "google.com", "github.com", "microsoft.com", "apple.com", "adobe.com",
+    "cloudflare.com", "googletagmanager.com", "w3.org", "schema.org",
+)
+# One anchored alternation: matches an excluded domain or any of its subdomains in a single scan
+_EXCLUDE_RE = re.compile(r"(?:^|\.)(?:" + "|".join(map(re.escape, _EXCLUDED)) + r")$")
+_BAD_EXT = ('.jpg', '.jpeg', '.png', '.gif', '.svg', '.css', '.js', '.json', '.xml')
+_MAX_FALLBACK_CANDIDATES = 15
+
+# --- Prompt Templates ---
+# Static instructions/schemas come first and per-call data last, so repeated calls share
+# an identical prefix that Gemini/Groq can serve from their prompt-prefix caches.
+
+DATA_SEPARATOR = "\n\n---DATA---\n"
+
+# Response schemas (Gemini OpenAPI subset) are sent as generationConfig.responseSchema, so
+# Gemini always returns bare, parseable JSON. Groq gets the same schema inlined in its prompt.
+
+def _str(description: str = "") -> dict:
+    return {"type": "STRING", "description": description} if description else {"type": "STRING"}
+
+def _int(description: str = "", nullable: bool = False) -> dict:
+    schema = {"type": "INTEGER"}
+    if nullable:
+        schema["nullable"] = True
+    if description:
+        schema["description"] = description
+    return schema
+
+def _list(items: dict) -> dict:
+    return {"type": "ARRAY", "items": items}
+
+def _object(properties: dict) -> dict:
+    return {"type": "OBJECT", "properties": properties, "required": list(properties)}
+
+COMPANY_FIELDS = {
+    "company_name": _str(),
+    "website": _str("The URL given in DATA"),
+    "industry_match": {"type": "BOOLEAN"},
+    "employee_count_estimate": _str("Estimate or Unknown"),
+    "locations": _list(_str()),
+    "certifications": _list(_str()),
+    "product_categories": _list(_str()),
+    "summary": _str("Short 1-sentence summary"),
+    "contact_info": _str("email/phone/Unknown"),
+    "relevance_score": _int("0-100"),
+}
+
+ANALYZE_COMPANY_INSTRUCTIONS = """
+Analyze the company in DATA against the requirements (Reqs) in DATA.
+"""
+ANALYZE_COMPANY_SCHEMA = _object(COMPANY_FIELDS)
+
+ANALYZE_BATCH_INSTRUCTIONS = """
+Analyze EACH company in the "companies" JSON array in DATA against the requirements (Reqs) in DATA.
+Return exactly one object per company, with the company's id from DATA.
+"""
+ANALYZE_BATCH_SCHEMA = _list(_object({
+    "id": _int("The company's id from DATA"),
+    **COMPANY_FIELDS,
+    "website": _str("The company's url from DATA"),
+}))
+
+EXTRACT_URLS_INSTRUCTIONS = """
+Task: Extract companies and their websites from the text in DATA.
+Target: Valid external B2B/company homepages. 
+Ignore: Social media (linkedin, facebook), internal links, news articles, or directories (clutch, yelp).
+If no companies are found, return [].
+"""
+CANDIDATES_SCHEMA = _list(_object({
+    "name": _str("Company Name"),
+    "url": _str("https://company-website.com"),
+}))
+
+LINKEDIN_INSTRUCTIONS = """
+Analyze the LinkedIn profile in DATA against the requirements (Reqs) in DATA.
+"""
+LINKEDIN_SCHEMA = _object({
+    **COMPANY_FIELDS,
+    "website": _str("Prefer external website if available"),
+    "linkedin_url": _str("The LinkedIn URL given in DATA"),
+    "follower_count": _int(),
+    "founded_year": _int(nullable=True),
+    "specialties": _list(_str()),
+})
+
+DISCOVERY_INSTRUCTIONS = """
+CRITICAL INSTRUCTION:
+- Return ONLY the official homepage URL for the company.
+- DO NOT return links to news articles, blog posts, definitions, or directories (like Wikipedia, Clutch, LinkedIn, etc.).
+- If the official site is not found, exclude the company.
+"""
+DISCOVERY_SCHEMA = _list(_object({
+    "name": _str("Company Name"),
+    "url": _str("https://company-official-website.com"),
+    "snippet": _str("Brief description."),
+}))
+
+ENRICH_INSTRUCTIONS = """
+Task: Populate the response fields for the company in DATA based on your knowledge of this company,
+checking it against the requirements in DATA.
+"""
+ENRICH_SCHEMA = _object({
+    **COMPANY_FIELDS,
+    "company_name": _str("The name given in DATA"),
+    "employee_count_estimate": _str("e.g. 50-200"),
+    "locations": _list(_str("City, Country")),
+    "summary": _str("Professional summary"),
+    "estimated_revenue": _str("e.g. $10M+"),
+    "market_cap": _str("e.g. Private or $1B"),
+    "strategic_goals": _list(_str()),
+    "linkedin_url": _str("https://linkedin.com/company/..."),
+    "follower_count": _int("Estimate"),
+    "founded_year": _int(),
+    "specialties": _list(_str()),
+})
+
+def format_requirements(config: SearchConfig) -> str:
+    # Stable for a whole research run, so it follows the static block and precedes per-company data
+    return f"Reqs: Ind:{config.included_industries}, Loc:{config.target_countries}, Key:{config.required_keywords}"
+
+# In-flight LLM calls keyed by prompt hash, so identical concurrent prompts share one request.
+# Each entry is [task, waiters]; the shared task is cancelled once its last waiter is.
+_inflight: dict[str, list] = {}
+
+def llm_cache_key(prompt: str, schema: Optional[dict] = None) -> str:
+    return llm_cache.key(prompt if schema is None else prompt + orjson.dumps(schema).decode())
+
+def _drop_inflight(cache_key: str, entry: list):
+    if _inflight.get(cache_key) is entry:
+        del _inflight[cache_key]
+
+async def call_llm(prompt: str, schema: Optional[dict] = None) -> Optional[str]:
     """
     Robust LLM Caller:
+    0. Joins an identical in-flight call, else returns a cached completion (SQLite, 24h TTL)
     1. Tries Gemini 2.0 Flash (Primary)
     2. Falls back to Groq Llama 3.3 70B (Secondary)
     3. Returns None if both fail.
+    With a response schema, the result is bare JSON (no markdown) from either provider.
     """
+    cache_key = llm_cache_key(prompt, schema)
+    entry = _inflight.get(cache_key)
+    if entry is None:
+        task = asyncio.create_task(fetch_llm(prompt, schema, cache_key))
+        entry = _inflight[cache_key] = [task, 0]
+        task.add_done_callback(lambda _, e=entry: _drop_inflight(cache_key, e))
+    task = entry[0]
+    entry[1] += 1
+    try:
+        # Shielded so one caller being cancelled doesn't cancel the call for the others
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if entry[1] == 1 and not task.done():
+            # Last waiter gone: stop the fetch so it stops spending tokens and rate-limit slots
+            _drop_inflight(cache_key, entry)
+            task.cancel()
+        raise
+    finally:
+        entry[1] -= 1
+
+async def fetch_llm(prompt: str, schema: Optional[dict], cache_key: str) -> Optional[str]:
+    cached = await llm_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    text = await call_llm_providers(prompt, schema)
+    if text:
+        await llm_cache.set(cache_key, text)
+    return text
+
+def is_rate_limited(e: Exception) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code == 429
+    return "RESOURCE_EXHAUSTED" in str(e)
+
+def gemini_payload(prompt: str, schema: Optional[dict] = None) -> dict:
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if schema is not None:
+        payload["generationConfig"] = {"responseMimeType": "application/json", "responseSchema": schema}
+    return payload
+
+def gemini_text(data: dict) -> str:
+    """Concatenates the text parts of the first candidate in a generateContent response."""
+    candidates = data.get("candidates") or [{}]
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts)
+
+async def gemini_generate(prompt: str, schema: Optional[dict] = None) -> str:
+    response = await _HTTP.post(
+        f"{GEMINI_URL}:generateContent",
+        headers={"x-goog-api-key": api_key},
+        json=gemini_payload(prompt, schema),
+    )
+    response.raise_for_status()
+    text = gemini_text(orjson.loads(response.content))
+    if not text:
+        raise ValueError("Gemini returned no text (blocked or empty candidate)")
+    return text
+
+async def groq_generate(prompt: str, schema: Optional[dict] = None) -> str:
+    if schema is not None:
+        # No schema enforcement on this path: spell it out ahead of the prompt and strip any fences
+        prompt = "Respond with ONLY raw JSON (no markdown) matching this schema:\n" + orjson.dumps(schema).decode() + "\n" + prompt
+    response = await _HTTP.post(
+        GROQ_URL,
+        headers={"Authorization": f"Bearer {groq_api_key}"},
+        json={
+            "model": GROQ_MODEL,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+        },
+    )
+    response.raise_for_status()
+    text = orjson.loads(response.content)["choices"][0]["message"]["content"]
+    return _strip_fences(text) if schema is not None else text
+
+async def call_llm_providers(prompt: str, schema: Optional[dict] = None) -> Optional[str]:
     # Attempt 1: Gemini
-    if client:
-        # Use semaphore only for Gemini as it has strict rate limits
-        async with gemini_semaphore:
-            try:
-                # Slight delay to respect RPM
-                await asyncio.sleep(0.5)
-                response = await asyncio.to_thread(
-                    client.models.generate_content,
-                    model='gemini-2.0-flash',
-                    contents=prompt
-                )
-                return response.text
-            except Exception as e:
-                print(f"WARN: Gemini API Failure ({type(e).__name__}). Switching to Groq fallback...", flush=True)
+    if api_key:
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            # Rate limit only Gemini as it has strict RPM quotas
+            async with gemini_limiter:
+                try:
+                    return await gemini_generate(prompt, schema)
+                except Exception as e:
+                    error = e
+            if not is_rate_limited(error) or attempt == GEMINI_MAX_RETRIES:
+                print(f"WARN: Gemini API Failure ({type(error).__name__}). Switching to Groq fallback...", flush=True)
+                break
+            # Exponential backoff with full jitter so throttled callers don't retry in lockstep
+            delay = random.uniform(0, min(GEMINI_BACKOFF_CAP, GEMINI_BACKOFF_BASE * 2 ** attempt))
+            print(f"WARN: Gemini rate limited, retrying in {delay:.1f}s ({attempt + 1}/{GEMINI_MAX_RETRIES})", flush=True)
+            await asyncio.sleep(delay)
     
     # Attempt 2: Groq
-    if groq_client:
+    if groq_api_key:
         try:
-            print("INFO: Calling Groq (llama-3.3-70b-versatile)...", flush=True)
-            chat_completion = await asyncio.to_thread(
-                groq_client.chat.completions.create,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                model="llama-3.3-70b-versatile",
-            )
-            return chat_completion.choices[0].message.content
+            print(f"INFO: Calling Groq ({GROQ_MODEL})...", flush=True)
+            return await groq_generate(prompt, schema)
         except Exception as e:
             print(f"ERROR: Groq API Failure: {e}", flush=True)
             
     print("CRITICAL: Both AI services failed.", flush=True)
     return None
 
+async def stream_llm(prompt: str, schema: Optional[dict] = None) -> AsyncIterator[str]:
+    """Yields Gemini response text as it is generated (SSE). No Groq fallback and no caching."""
+    await gemini_limiter.acquire()
+    async with _HTTP.stream(
+        "POST",
+        f"{GEMINI_URL}:streamGenerateContent",
+        params={"alt": "sse"},
+        headers={"x-goog-api-key": api_key},
+        json=gemini_payload(prompt, schema),
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                text = gemini_text(orjson.loads(line[5:]))
+                if text:
+                    yield text
+
+def is_valid_candidate(c) -> bool:
+    return isinstance(c, dict) and "http" in str(c.get("url", "")).lower() and bool(c.get("name"))
+
+async def stream_candidates(prompt: str, limit: int = MAX_STREAMED_CANDIDATES) -> List[dict]:
+    """
+    Parses a streamed JSON array of candidates with ijson, validating each object as it
+    arrives and cancelling the stream once `limit` valid candidates are collected.
+    Returns [] if streaming is unavailable or nothing valid was parsed.
+    """
+    if not (api_key and ijson):
+        return []
+
+    parsed = ijson.sendable_list()
+    parser = ijson.items_coro(parsed, 'item')
+    valid_candidates = []
+    started = False
+    try:
+        async with aclosing(stream_llm(prompt, CANDIDATES_SCHEMA)) as chunks:
+            async for chunk in chunks:
+                if not started:
+                    # Skip a markdown fence or preamble before the array opens
+                    start = chunk.find("[")
+                    if start == -1:
+                        continue
+                    chunk, started = chunk[start:], True
+                try:
+                    parser.send(chunk.encode())
+                    error = None
+                except ijson.JSONError as e:
+                    error = e
+                # Objects completed before a parse error (e.g. a closing fence after the array) still count
+                valid_candidates.extend(c for c in parsed if is_valid_candidate(c))
+                del parsed[:]
+                if error and not valid_candidates:
+                    raise error
+                if error or len(valid_candidates) >= limit:
+                    break
+    except Exception as e:
+        print(f"WARN: Streaming extraction stopped ({type(e).__name__}: {e})", flush=True)
+    return valid_candidates[:limit]
+
 async def analyze_companies(scraped_data: dict[str, ScrapedContent], config: SearchConfig) -> List[CompanyAnalysis]:
     """
     Analyzes scraped data to extract structured company information.
+    Companies are sent ANALYSIS_BATCH_SIZE at a time so the schema is paid for once per batch.
     """
-    analyzed_companies = []
-    
-    # We create tasks but they will be throttled by the semaphore inside the function
-    tasks = [analyze_single_company(content, config) for content in scraped_data.values()]
-    
-    # Run all tasks (they will respect the semaphore)
-    results = await asyncio.gather(*tasks)
-    
-    for analysis in results:
-        if analysis:
-            analyzed_companies.append(analysis)
+    contents = list(scraped_data.values())
+    # One slot per input page so results keep the input order
+    analyses: List[Optional[CompanyAnalysis]] = [None] * len(contents)
+    relevant = list(range(len(contents)))
+
+    # Pages mentioning none of the required keywords/industries are obvious rejections; skip the LLM for them
+    page_matches = keyword_prefilter(config)
+    if page_matches:
+        relevant = []
+        for i, content in enumerate(contents):
+            if page_matches(content):
+                relevant.append(i)
+            else:
+                analyses[i] = fallback_analysis_for(content, "Skipped: no required keywords or industries found on the page.")
+        if len(relevant) < len(contents):
+            print(f"DEBUG: Keyword prefilter skipped {len(contents) - len(relevant)} of {len(scraped_data)} pages.", flush=True)
+
+    batches = [relevant[i:i + ANALYSIS_BATCH_SIZE] for i in range(0, len(relevant), ANALYSIS_BATCH_SIZE)]
+    
+    # Batches still go through the Gemini throttle inside call_llm
+    results = await asyncio.gather(*(analyze_company_batch([contents[i] for i in batch], config) for batch in batches))
+    
+    for batch, batch_results in zip(batches, results):
+        for i, analysis in zip(batch, batch_results):
+            analyses[i] = analysis
             
-    return analyzed_companies
+    return [analysis for analysis in analyses if analysis]
 
-async def analyze_single_company(content: ScrapedContent, config: SearchConfig) -> Optional[CompanyAnalysis]:
-    # Fallback data if AI fails
-    fallback_analysis = CompanyAnalysis(
+async def analyze_company_batch(contents: List[ScrapedContent], config: SearchConfig) -> List[Optional[CompanyAnalysis]]:
+    """
+    Analyzes several companies in one LLM call. Items missing from (or invalid in)
+    the response are re-issued individually through analyze_single_company.
+    """
+    if len(contents) == 1:
+        return [await analyze_single_company(contents[0], config)]
+
+    payload = [
+        {
+            "id": i,
+            "url": content.url,
+            "title": content.page_title,
+            "desc": content.meta_description,
+            "text_snippet": _trunc(content.text_content, PAGE_TEXT_TOKENS),
+            "sub_pages": {cat: _trunc(text, SUB_PAGE_TOKENS) for cat, text in content.sub_pages.items()},
+        }
+        for i, content in enumerate(contents)
+    ]
+    companies_json = orjson.dumps({"companies": payload}).decode()
+    prompt = ANALYZE_BATCH_INSTRUCTIONS + DATA_SEPARATOR + format_requirements(config) + "\n" + companies_json
+
+    analyses: List[Optional[CompanyAnalysis]] = [None] * len(contents)
+
+    text_response = await call_llm(prompt, ANALYZE_BATCH_SCHEMA)
+    if text_response:
+        try:
+            items = orjson.loads(text_response)
+            if not isinstance(items, list):
+                items = []
+        except Exception as e:
+            print(f"Error parsing batch analysis of {len(contents)} companies: {e}")
+            items = []
+
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            idx = item.pop("id", None)
+            if not isinstance(idx, int) or not 0 <= idx < len(contents) or analyses[idx]:
+                continue
+            # Ensure data matches model
+            item['website'] = contents[idx].url
+            try:
+                analyses[idx] = CompanyAnalysis(**item)
+            except Exception as e:
+                print(f"Error analyzing {contents[idx].url} in batch: {e}")
+
+    failed = [i for i, analysis in enumerate(analyses) if analysis is None]
+    if failed:
+        retries = await asyncio.gather(*(analyze_single_company(contents[i], config) for i in failed))
+        for i, analysis in zip(failed, retries):
+            analyses[i] = analysis
+
+    return analyses
+
+def fallback_analysis_for(content: ScrapedContent, summary: Optional[str] = None) -> CompanyAnalysis:
+    """Zero-relevance analysis built from the page alone, for pages the LLM didn't (or couldn't) analyze."""
+    return CompanyAnalysis(
         company_name=content.page_title or "Unknown Company",
         website=content.url,
         industry_match=False, # Unknown
@@ -98,52 +556,30 @@ async def analyze_single_company(content: ScrapedContent, config: SearchConfig)
         locations=[],
         certifications=[],
         product_categories=[],
-        summary=content.meta_description or "No summary available (Analysis Failed).",
+        summary=summary or content.meta_description or "No summary available (Analysis Failed).",
         contact_info=None,
         relevance_score=0
     )
 
+async def analyze_single_company(content: ScrapedContent, config: SearchConfig) -> Optional[CompanyAnalysis]:
+    # Fallback data if AI fails
+    fallback_analysis = fallback_analysis_for(content)
+
     # Ultra-concise context to save tokens
-    context_text = f"URL:{content.url}\nT:{content.page_title}\nD:{content.meta_description}\nTXT:{content.text_content[:1500]}..."
-    
-    for cat, text in content.sub_pages.items():
-        context_text += f"\n{cat.upper()}:{text[:500]}..."
+    parts = [f"URL:{content.url}\nT:{content.page_title}\nD:{content.meta_description}\nTXT:{_trunc(content.text_content, PAGE_TEXT_TOKENS)}..."]
+    parts.extend(f"\n{cat.upper()}:{_trunc(text, SUB_PAGE_TOKENS)}..." for cat, text in content.sub_pages.items())
+    context_text = "".join(parts)
 
-    prompt = f"""
-    Analyze company vs reqs:
-    Reqs: Ind:{config.included_industries}, Loc:{config.target_countries}, Key:{config.required_keywords}
-    
-    Data:
-    {context_text}
-    
-    Output JSON (no markdown):
-    {{
-    "company_name": "str",
-    "website": "{content.url}",
-    "industry_match": bool,
-    "employee_count_estimate": "str/Unknown",
-    "locations": ["str"],
-    "certifications": ["str"],
-    "product_categories": ["str"],
-    "summary": "Short 1-sentence summary",
-    "contact_info": "email/phone/Unknown",
-    "relevance_score": int(0-100)
-    }}
-    """
+    prompt = ANALYZE_COMPANY_INSTRUCTIONS + DATA_SEPARATOR + format_requirements(config) + "\n" + context_text
 
-    text_response = await call_llm(prompt)
+    text_response = await call_llm(prompt, ANALYZE_COMPANY_SCHEMA)
     if not text_response:
         print(f"Failed to analyze {content.url} after retries. Using fallback.")
         return fallback_analysis
 
     try:
-        text_response = text_response.replace("```json", "").replace("```", "").strip()
-        data = json.loads(text_response)
-        
         # Ensure data matches model
-        data['website'] = content.url
-        
-        return CompanyAnalysis(**data)
+        return CompanyAnalysis.model_validate_json(text_response).model_copy(update={'website': content.url})
 
     except Exception as e:
         print(f"Error analyzing {content.url}: {e}")
@@ -156,33 +592,26 @@ async def extract_candidate_urls(content: ScrapedContent) -> List[dict]:
     Returns: [{"name": "Company Name", "url": "https://company.com"}, ...]
     """
     # Context specifically for URL extraction
-    context_text = f"Title: {content.page_title}\n\nText Content Snippet:\n{content.text_content[:20000]}..." 
-    
-    prompt = """
-    Task: Extract companies and their websites from this text.
-    Target: Valid external B2B/company homepages. 
-    Ignore: Social media (linkedin, facebook), internal links, news articles, or directories (clutch, yelp).
-    
-    Output strictly a RAW JSON list of objects:
-    [{"name": "Company Name", "url": "https://company-website.com"}]
+    context_text = f"Title: {content.page_title}\n\nText Content Snippet:\n{_trunc(content.text_content, LISTICLE_TEXT_TOKENS)}..." 
     
-    If no companies are found, return [].
-    """
-    
-    text_response = await call_llm(prompt + "\n\nText:\n" + context_text)
+    prompt = EXTRACT_URLS_INSTRUCTIONS + DATA_SEPARATOR + context_text
+    print(f"DEBUG: Extracting from {content.url} (len: {len(context_text)})", flush=True)
+
+    # Stream and validate candidates incrementally unless a cached response is available
+    if await llm_cache.get(llm_cache_key(prompt, CANDIDATES_SCHEMA)) is None:
+        valid_candidates = await stream_candidates(prompt)
+        if valid_candidates:
+            print(f"DEBUG: Found {len(valid_candidates)} valid candidates via streamed LLM from {content.url}", flush=True)
+            return valid_candidates
+
+    # Bulk parse when streaming is unavailable or produced nothing
+    text_response = await call_llm(prompt, CANDIDATES_SCHEMA)
 
     if text_response:
         try:
-            print(f"DEBUG: Extracting from {content.url} (len: {len(context_text)})", flush=True)
-            text_response = text_response.replace("```json", "").replace("```", "").strip()
-            candidates = json.loads(text_response)
+            candidates = orjson.loads(text_response)
             if isinstance(candidates, list):
-                valid_candidates = []
-                for c in candidates:
-                    url = c.get("url", "").lower()
-                    name = c.get("name", "")
-                    if "http" in url and name:
-                        valid_candidates.append(c)
+                valid_candidates = [c for c in candidates if is_valid_candidate(c)]
                 
                 if valid_candidates:
                     print(f"DEBUG: Found {len(valid_candidates)} valid candidates via LLM from {content.url}", flush=True)
@@ -192,49 +621,41 @@ async def extract_candidate_urls(content: ScrapedContent) -> List[dict]:
 
     # --- Regex Fallback if LLM fails ---
     print(f"DEBUG: LLM failed to extract meaningful URLs from {content.url}. Using Regex fallback...", flush=True)
-    import re
-    from urllib.parse import urlparse
-    
-    # Simple regex to find http/https links
-    raw_links = re.findall(r'https?://[^\s<>"]+', content.text_content)
     
     unique_links = set()
     fallback_candidates = []
     
-    current_domain = urlparse(content.url).netloc
-    
-    excluded_domains = [
-        "linkedin.com", "facebook.com", "twitter.com", "instagram.com", "youtube.com", 
-        "google.com", "github.com", "microsoft.com", "apple.com", "adobe.com",
-        "cloudflare.com", "googletagmanager.com", "w3.org", "schema.org",
-        current_domain # Exclude self
-    ]
+    current_domain = host_of(content.url)
+    current_subdomain_suffix = "." + current_domain
     
-    for link in raw_links:
+    for match in _URL_RE.finditer(content.text_content):
         # cleanup
-        link = link.rstrip('.,;)]}')
+        link = match.group().rstrip('.,;')
+        if link in unique_links:
+            continue
         
         try:
-            parsed = urlparse(link)
-            domain = parsed.netloc.lower()
+            domain = host_of(link)
+        except ValueError:
+            continue
+        
+        # Exclude social/infra domains (and their subdomains) and self
+        if not domain or _EXCLUDE_RE.search(domain) or domain == current_domain or domain.endswith(current_subdomain_suffix):
+            continue
             
-            if not domain or any(ex in domain for ex in excluded_domains):
-                continue
-                
-            # Filter file extensions
-            if any(link.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.svg', '.css', '.js', '.json', '.xml']):
-                continue
-                
-            if link not in unique_links:
-                unique_links.add(link)
-                # Create a simple candidate object
-                fallback_candidates.append({"name": f"Extracted: {domain}", "url": link})
-        except:
+        # Filter file extensions
+        if link.lower().endswith(_BAD_EXT):
             continue
             
-    # Limit fallback to top 15 to avoid junk
+        unique_links.add(link)
+        # Create a simple candidate object
+        fallback_candidates.append({"name": f"Extracted: {domain}", "url": link})
+        # Limit fallback to top 15 to avoid junk
+        if len(fallback_candidates) >= _MAX_FALLBACK_CANDIDATES:
+            break
+            
     print(f"DEBUG: Regex fallback found {len(fallback_candidates)} potential links.", flush=True)
-    return fallback_candidates[:15]
+    return fallback_candidates
 
 async def analyze_linkedin_company(data: dict, config: SearchConfig) -> Optional[CompanyAnalysis]:
     """
@@ -252,50 +673,25 @@ async def analyze_linkedin_company(data: dict, config: SearchConfig) -> Optional
     followers = data.get("followerCount", 0)
     confirmed_locations = data.get("locations", [])
     
-    context_text = f"""
-    Company: {company_name}
-    LinkedIn: {linkedin_url}
-    Website: {website}
-    Tagline: {tagline}
-    About: {about[:5000]}
-    Industry: {industry}
-    Specialties: {', '.join(specialties) if isinstance(specialties, list) else specialties}
-    Followers: {followers}
-    Locations: {confirmed_locations}
-    """
-    
-    prompt = f"""
-    Analyze this LinkedIn profile against requirements:
-    Reqs: Ind:{config.included_industries}, Loc:{config.target_countries}, Key:{config.required_keywords}
-    
-    Data:
-    {context_text}
-    
-    Output JSON (no markdown):
-    {{
-    "company_name": "str",
-    "website": "str (prefer external website if available)",
-    "industry_match": bool,
-    "employee_count_estimate": "str/Unknown",
-    "locations": ["str"],
-    "certifications": ["str"],
-    "product_categories": ["str"],
-    "summary": "Short 1-sentence summary",
-    "contact_info": "email/phone/Unknown",
-    "linkedin_url": "{linkedin_url}",
-    "follower_count": int,
-    "founded_year": int or null,
-    "specialties": ["str"],
-    "relevance_score": int(0-100)
-    }}
-    """
-    
-    text_response = await call_llm(prompt)
+    context_text = "\n".join([
+        f"Company: {company_name}",
+        f"LinkedIn: {linkedin_url}",
+        f"Website: {website}",
+        f"Tagline: {tagline}",
+        f"About: {_trunc(about, LINKEDIN_ABOUT_TOKENS)}",
+        f"Industry: {industry}",
+        f"Specialties: {', '.join(specialties) if isinstance(specialties, list) else specialties}",
+        f"Followers: {followers}",
+        f"Locations: {confirmed_locations}",
+    ])
+    
+    prompt = LINKEDIN_INSTRUCTIONS + DATA_SEPARATOR + format_requirements(config) + "\n" + context_text
+    
+    text_response = await call_llm(prompt, LINKEDIN_SCHEMA)
     if not text_response: return None
 
     try:
-        text_response = text_response.replace("```json", "").replace("```", "").strip()
-        result = json.loads(text_response)
+        result = orjson.loads(text_response)
         
         # Fill in missing fields from raw data if LLM missed them
         if "linkedin_url" not in result or not result["linkedin_url"]:
@@ -394,11 +790,10 @@ async def discover_companies_with_gemini(config: SearchConfig, limit: int = 5) -
     print(f"DEBUG: Discovering with Gemini. Config: Ind={config.included_industries}, Loc={config.target_countries}", flush=True)
 
     async def get_companies(prompt_text):
-        text = await call_llm(prompt_text)
+        text = await call_llm(prompt_text, DISCOVERY_SCHEMA)
         if not text: return []
 
         try:
-            text = text.replace("```json", "").replace("```", "").strip()
             # Handle potential markdown wrapping or prefixes
             if "[" not in text: 
                 print(f"DEBUG: Invalid JSON format: {text[:100]}")
@@ -411,56 +806,53 @@ async def discover_companies_with_gemini(config: SearchConfig, limit: int = 5) -
                 text = text[start:end]
 
             print(f"DEBUG: Raw response len: {len(text)}", flush=True)
-            data = json.loads(text)
+            data = orjson.loads(text)
             return data
         except Exception as e:
             print(f"DEBUG: Discovery parsing failed: {type(e).__name__}: {e}")
             return []
 
     # Attempt 1: Strict/Specific Search
-    prompt_1 = f"""
+    prompt_1 = DISCOVERY_INSTRUCTIONS + DATA_SEPARATOR + f"""
     Task: Identify {limit} companies relevant to:
     Industry: {config.included_industries}
     Keywords: {config.required_keywords}
     Location: {config.target_countries}
-    
-    CRITICAL INSTRUCTION:
-    - Return ONLY the official homepage URL for the company.
-    - DO NOT return links to news articles, blog posts, definitions, or directories (like Wikipedia, Clutch, LinkedIn, etc.).
-    - If the official site is not found, exclude the company.
-    
-    Output strictly a RAW JSON list of objects:
-    [
-      {{
-        "name": "Company Name",
-        "url": "https://company-official-website.com", 
-        "snippet": "Brief description."
-      }}
-    ]
     """
     
-    results = await get_companies(prompt_1)
-    if results: return results
-    
-    print("DEBUG: Primary search returned empty. Retrying with broader scope...", flush=True)
-    
     # Attempt 2: Industry Broad Search
-    prompt_2 = f"""
+    prompt_2 = DISCOVERY_INSTRUCTIONS + DATA_SEPARATOR + f"""
     Task: List {limit} major companies in the '{config.included_industries}' industry.
-    Ignore other constraints if necessary. Return JSON list as above.
+    Ignore other constraints if necessary.
     """
-    results = await get_companies(prompt_2)
-    if results: return results
-    
-    print("DEBUG: Industry search returned empty. Retrying with generic fallback...", flush=True)
 
     # Attempt 3: Generic Fallback (Guarantee)
-    prompt_3 = f"""
+    prompt_3 = DISCOVERY_INSTRUCTIONS + DATA_SEPARATOR + f"""
     Task: List {limit} major global technology or service companies.
-    Return JSON list as above.
     """
-    results = await get_companies(prompt_3)
-    if results: return results
+
+    empty_messages = [
+        "DEBUG: Primary search returned empty. Using broader scope...",
+        "DEBUG: Industry search returned empty. Using generic fallback...",
+        "DEBUG: Generic search returned empty.",
+    ]
+
+    # Run all attempts at once (gemini_limiter still paces them) and return the
+    # first non-empty result whose higher-priority attempts all came back empty
+    tasks = [asyncio.create_task(get_companies(p)) for p in (prompt_1, prompt_2, prompt_3)]
+    try:
+        pending = set(tasks)
+        checked = 0
+        while pending:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            while checked < len(tasks) and tasks[checked].done():
+                results = tasks[checked].result()
+                if results: return results
+                print(empty_messages[checked], flush=True)
+                checked += 1
+    finally:
+        for task in tasks:
+            task.cancel()
 
     # Attempt 4: Total Failure (Nuclear Option)
     print("CRITICAL: All AI attempts failed. Using Hardcoded Fallback.", flush=True)
@@ -474,45 +866,21 @@ async def enrich_company_with_gemini(company: dict, config: SearchConfig) -> Opt
     url = company.get("url", "")
     snippet = company.get("snippet", "")
     
-    prompt = f"""
-    Analyze the company "{name}" ({url}).
-    Context: {snippet}
-    
-    Task: Populate the following fields based on your knowledge of this company.
-    
+    prompt = ENRICH_INSTRUCTIONS + DATA_SEPARATOR + f"""
     Requirements check:
     - Included Industries: {config.included_industries}
     - Target Locations: {config.target_countries}
     - Required Keywords: {config.required_keywords}
 
-    Output JSON (no markdown):
-    {{
-    "company_name": "{name}",
-    "website": "{url}",
-    "industry_match": bool,
-    "employee_count_estimate": "str (e.g. 50-200)",
-    "locations": ["City, Country"],
-    "certifications": ["str"],
-    "product_categories": ["str"],
-    "summary": "Professional summary",
-    "contact_info": "email/phone/Unknown",
-    "estimated_revenue": "str (e.g. $10M+)",
-    "market_cap": "str (e.g. Private or $1B)",
-    "strategic_goals": ["Goal 1", "Goal 2"],
-    "linkedin_url": "https://linkedin.com/company/...", 
-    "follower_count": int (estimate),
-    "founded_year": int,
-    "specialties": ["str"],
-    "relevance_score": int(0-100)
-    }}
+    Company: "{name}" ({url})
+    Context: {snippet}
     """
     
-    text_response = await call_llm(prompt)
+    text_response = await call_llm(prompt, ENRICH_SCHEMA)
     if not text_response: return None
 
     try:
-        text = text_response.replace("```json", "").replace("```", "").strip()
-        data = json.loads(text)
+        data = orjson.loads(text_response)
         
         # Ensure defaults
         if "linkedin_url" not in data: data["linkedin_url"] = ""
@@ -0,0 +1,34 @@
+import os
+import httpx
+import orjson
+from apify_client import ApifyClientAsync
+from dotenv import load_dotenv
+
+load_dotenv()
+
+APIFY_API_TOKEN = os.getenv("APIFY_API_TOKEN")
+APIFY_API_URL = "https://api.apify.com/v2"
+APIFY_SYNC_TIMEOUT = 300  # the run-sync endpoints cap runs at 300 seconds
+
+# One client (and so one HTTP connection pool) shared by every Apify-backed service
+apify_client = ApifyClientAsync(APIFY_API_TOKEN) if APIFY_API_TOKEN else None
+
+# Raw REST pool for endpoints apify-client doesn't wrap
+_HTTP = httpx.AsyncClient(timeout=APIFY_SYNC_TIMEOUT + 30)
+
+async def close_apify_http():
+    await _HTTP.aclose()
+
+async def run_actor_sync_items(actor_id: str, run_input: dict) -> list:
+    """
+    Runs an actor and returns its dataset items in the same response
+    (run-sync-get-dataset-items), so there is no run-status polling round trip.
+    """
+    resp = await _HTTP.post(
+        f"{APIFY_API_URL}/acts/{actor_id.replace('/', '~')}/run-sync-get-dataset-items",
+        params={"timeout": APIFY_SYNC_TIMEOUT, "clean": "true"},
+        headers={"Authorization": f"Bearer {APIFY_API_TOKEN}"},
+        json=run_input,
+    )
+    resp.raise_for_status()
+    return orjson.loads(resp.content)
@@ -1,21 +1,18 @@
 import asyncio
-import os
-from apify_client import ApifyClientAsync
 from app.models import ScrapedContent
+from app.services.apify_shared import apify_client
+from app.services.url_utils import host_of
 from typing import List, Dict
 
-# Ensure APIFY_API_TOKEN is available
-APIFY_API_TOKEN = os.getenv("APIFY_API_TOKEN")
-
 async def crawl_companies(urls: List[str]) -> Dict[str, ScrapedContent]:
     """
     Crawls a list of company URLs using Apify's Website Content Crawler to extract deep content.
     """
-    if not APIFY_API_TOKEN:
+    if not apify_client:
         print("Error: APIFY_API_TOKEN not found. Cannot perform crawling.")
         return {}
 
-    client = ApifyClientAsync(APIFY_API_TOKEN)
+    client = apify_client
     results = {}
     
     # We will trigger a single crawl run for all valid URLs
@@ -48,31 +45,25 @@ async def crawl_companies(urls: List[str]) -> Dict[str, ScrapedContent]:
 
         print(f"Apify run finished. Fetching results from dataset {run['defaultDatasetId']}...")
 
-        # Fetch results
-        dataset_items = await client.dataset(run["defaultDatasetId"]).list_items()
-        
-        # Process results
+        # Process results as they are paged in from the dataset
         # The crawler might return multiple items per domain if it crawled subpages.
         # We need to aggregate them by company/root URL.
         
         url_content_map = {}
+        
+        # Map each requested host to its base URL so every item is matched with one lookup
+        base_by_host = {host_of(base): base for base in urls}
 
-        for item in dataset_items.items:
+        async for item in client.dataset(run["defaultDatasetId"]).iterate_items():
             url = item.get("url", "")
             text = item.get("markdown", "") or item.get("text", "")
             title = item.get("metadata", {}).get("title", "") or item.get("title", "")
             desc = item.get("metadata", {}).get("description", "") or item.get("description", "")
             
-            # Robust matching logic
-            matched_base_url = None
-            
-            # 1. Try exact or simple prefix match
-            for base in urls:
-                if base in url or url in base: # loose check
-                    matched_base_url = base
-                    break
+            # Match on host (ignoring "www.") rather than substrings, which could pair foo.com with foobar.com
+            matched_base_url = base_by_host.get(host_of(url))
             
-            # 2. If valid match found
+            # If valid match found
             if matched_base_url:
                 if matched_base_url not in url_content_map:
                     url_content_map[matched_base_url] = {
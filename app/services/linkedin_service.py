@@ -1,33 +1,84 @@
 import os
 import asyncio
+import orjson
+from urllib.parse import urlsplit
 from apify_client import ApifyClientAsync
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from app.models import CompanyBasicInfo
+from app.services.sqlite_cache import SQLiteCache
+from app.services.apify_shared import apify_client
 from dotenv import load_dotenv
 
 load_dotenv()
 
-APIFY_API_TOKEN = os.getenv("APIFY_API_TOKEN")
+# Companies per Google Search Scraper run in find_linkedin_urls
+LINKEDIN_SEARCH_SHARD_SIZE = 50
+
+# Recently scraped profiles and resolved company URLs are reused instead of paying Apify again
+LINKEDIN_CACHE_PATH = os.getenv("LINKEDIN_CACHE_PATH", os.path.join("output", "linkedin_cache.sqlite"))
+LINKEDIN_CACHE_TTL = 7 * 86400  # 7 days in seconds
+# One connection/lock for the file; entries are namespaced by key prefix
+linkedin_cache = SQLiteCache(LINKEDIN_CACHE_PATH, LINKEDIN_CACHE_TTL, "linkedin_cache")
+
+def url_cache_key(company_name: str) -> str:
+    return f"url:{company_name.strip().lower()}"
+
+def profile_cache_key(linkedin_url: str) -> str:
+    return f"profile:{normalize_linkedin_url(linkedin_url)}"
+
+def normalize_linkedin_url(url: str) -> str:
+    """Canonical form of a LinkedIn page URL: www host, lowercase path, no query/fragment or trailing slash."""
+    return f"https://www.linkedin.com{urlsplit(url.strip()).path.rstrip('/').lower()}"
 
 async def find_linkedin_urls(company_names: List[str]) -> Dict[str, str]:
     """
     Uses Google Search via Apify to find LinkedIn Company Page URLs for a list of company names.
     Returns: {"Company Name": "https://www.linkedin.com/company/..."}
     """
-    if not APIFY_API_TOKEN:
+    name_to_url = {}
+    company_names = list(dict.fromkeys(company_names))
+
+    cached_urls = await linkedin_cache.get_many([url_cache_key(name) for name in company_names])
+    misses = []
+    for name in company_names:
+        url = cached_urls.get(url_cache_key(name))
+        if url:
+            name_to_url[name] = url
+        else:
+            misses.append(name)
+
+    if not misses:
+        return name_to_url
+
+    if not apify_client:
         print("Error: APIFY_API_TOKEN missing.")
-        return {}
+        return name_to_url
+
+    client = apify_client
 
-    client = ApifyClientAsync(APIFY_API_TOKEN)
+    print(f"DEBUG: Searching for LinkedIn URLs for {len(misses)} companies ({len(name_to_url)} cached)...", flush=True)
+
+    # Large lists are split into shards whose Apify runs overlap
+    shards = [misses[i:i + LINKEDIN_SEARCH_SHARD_SIZE] for i in range(0, len(misses), LINKEDIN_SEARCH_SHARD_SIZE)]
+    found = {}
+    for shard_result in await asyncio.gather(*(search_linkedin_shard(client, shard) for shard in shards)):
+        found.update(shard_result)
+    name_to_url.update(found)
+    # Only found URLs are cached; a miss may just be a flaky search
+    await linkedin_cache.set_many([(url_cache_key(name), url) for name, url in found.items()])
+
+    return name_to_url
+
+async def search_linkedin_shard(client: ApifyClientAsync, company_names: List[str]) -> Dict[str, str]:
     name_to_url = {}
 
     # Construct queries: "site:linkedin.com/company [Company Name]"
-    queries = [f"site:linkedin.com/company {name}" for name in company_names]
+    # and remember which company each query belongs to
+    query_to_name = {f"site:linkedin.com/company {name.strip()}": name for name in company_names}
     
-    # We can batch these or run them 
     # Apify Google Search Scraper supports multiple queries
     run_input = {
-        "queries": "\n".join(queries),
+        "queries": "\n".join(query_to_name),
         "resultsPerPage": 1, 
         "maxPagesPerQuery": 1,
         "languageCode": "en",
@@ -35,27 +86,16 @@ async def find_linkedin_urls(company_names: List[str]) -> Dict[str, str]:
         "includeUnfilteredResults": False,
     }
 
-    print(f"DEBUG: Searching for LinkedIn URLs for {len(company_names)} companies...", flush=True)
-
     try:
         run = await client.actor("apify/google-search-scraper").call(run_input=run_input)
         
         if not run:
             return {}
 
-        dataset_items = await client.dataset(run["defaultDatasetId"]).list_items()
-        
-        # We need to map results back to the company name. 
-        # Since queries are processed in order (mostly), or we can check the searchQuery in the result item
-        
-        for item in dataset_items.items:
-            search_query = item.get("searchQuery", {}).get("term", "")
-            # search_query looks like "site:linkedin.com/company Name"
-            
-            # Extract company name from query
-            if "site:linkedin.com/company " in search_query:
-                company_name = search_query.replace("site:linkedin.com/company ", "").strip()
-            else:
+        async for item in client.dataset(run["defaultDatasetId"]).iterate_items():
+            # Map the result back to the company name through its searchQuery term
+            company_name = query_to_name.get(item.get("searchQuery", {}).get("term", "").strip())
+            if not company_name:
                 continue
 
             organic_results = item.get("organicResults", [])
@@ -72,45 +112,63 @@ async def find_linkedin_urls(company_names: List[str]) -> Dict[str, str]:
     return name_to_url
 
 
-async def scrape_linkedin_companies(linkedin_urls: List[str]) -> List[Dict]:
+async def scrape_linkedin_companies(linkedin_urls: List[str]) -> AsyncIterator[Dict]:
     """
     Scrapes LinkedIn company pages using Apify (dev_fusion/linkedin-company-scraper).
-    Returns list of company data dicts.
+    Yields company data dicts as they are read from the run's dataset.
+    Profiles scraped within LINKEDIN_CACHE_TTL are yielded from the local cache.
     """
-    if not APIFY_API_TOKEN or not linkedin_urls:
-        return []
-
-    client = ApifyClientAsync(APIFY_API_TOKEN)
+    # Dedupe URL variants (tracking params, trailing slash, casing) before paying for them
+    linkedin_urls = list(dict.fromkeys(normalize_linkedin_url(url) for url in linkedin_urls))
+    if not linkedin_urls:
+        return
+
+    cached_profiles = await linkedin_cache.get_many([profile_cache_key(url) for url in linkedin_urls])
+    misses = []
+    for url in linkedin_urls:
+        cached = cached_profiles.get(profile_cache_key(url))
+        if cached:
+            yield orjson.loads(cached)
+        else:
+            misses.append(url)
+
+    if not misses or not apify_client:
+        return
+
+    client = apify_client
     
-    print(f"DEBUG: Scraping {len(linkedin_urls)} LinkedIn profiles...", flush=True)
+    print(f"DEBUG: Scraping {len(misses)} LinkedIn profiles ({len(linkedin_urls) - len(misses)} cached)...", flush=True)
     
     # input for dev_fusion/linkedin-company-scraper
     run_input = {
-        "urls": linkedin_urls,
+        "urls": misses,
     }
     
     ACTOR_ID = "dev_fusion/linkedin-company-scraper" 
 
+    to_cache = []
     try:
         run = await client.actor(ACTOR_ID).call(run_input=run_input)
         
         if not run:
             print("LinkedIn scrape run failed/empty.")
-            return []
+            return
 
-        dataset_items = await client.dataset(run["defaultDatasetId"]).list_items()
-        
-        results = []
-        for item in dataset_items.items:
+        count = 0
+        async for item in client.dataset(run["defaultDatasetId"]).iterate_items():
             # Clean up Apify metadata: Filter for valid company profiles
             if item.get("companyName") or item.get("name"):
                  # Normalize keys if needed or just pass raw
-                 results.append(item)
+                 count += 1
+                 profile_url = item.get("url") or item.get("linkedinUrl")
+                 if profile_url:
+                     to_cache.append((profile_cache_key(profile_url), orjson.dumps(item).decode()))
+                 yield item
         
-        print(f"DEBUG: Successfully scraped {len(results)} valid LinkedIn profiles.", flush=True)
-        print(f"DEBUG: LinkedIn Data Sample: {str(results)[:200]}...", flush=True) # Log for verification
-        return results
+        print(f"DEBUG: Successfully scraped {count} valid LinkedIn profiles.", flush=True)
 
     except Exception as e:
         print(f"Error scraping LinkedIn: {e}", flush=True)
-        return []
+    finally:
+        # Profiles are written in one transaction, including those read before an early exit
+        await linkedin_cache.set_many(to_cache)
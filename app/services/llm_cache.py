@@ -0,0 +1,8 @@
+import os
+from app.services.sqlite_cache import SQLiteCache
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("output", "llm_cache.sqlite"))
+LLM_CACHE_TTL = 86400  # 24 hours in seconds
+
+# Exact-match cache for LLM completions, keyed by the SHA-256 of the prompt
+llm_cache = SQLiteCache(LLM_CACHE_PATH, LLM_CACHE_TTL, "llm_cache")
@@ -2,8 +2,9 @@ import os
 from google import genai
 from typing import List
 from app.models import SearchConfig
+from app.services.sqlite_cache import SQLiteCache
 from dotenv import load_dotenv
-import json
+import orjson
 import asyncio
 
 load_dotenv()
@@ -14,10 +15,29 @@ client = None
 if api_key:
     client = genai.Client(api_key=api_key)
 
+# Generated queries depend only on industries/countries/keywords, so they are cached
+# on disk by that (order-insensitive) signature and survive restarts
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", os.path.join("output", "query_cache.sqlite"))
+QUERY_CACHE_TTL = 7 * 86400  # 7 days in seconds
+query_cache = SQLiteCache(QUERY_CACHE_PATH, QUERY_CACHE_TTL, "search_queries")
+
+def query_signature(config: SearchConfig) -> tuple:
+    return (
+        tuple(sorted(config.included_industries)),
+        tuple(sorted(config.target_countries)),
+        tuple(sorted(config.required_keywords)),
+    )
+
 async def generate_search_queries(config: SearchConfig) -> List[str]:
     """
     Uses Gemini to generate targeted search queries based on the user configuration.
     """
+    industries, countries, keywords = signature = query_signature(config)
+    cache_key = orjson.dumps(signature).decode()
+    cached = await query_cache.get(cache_key)
+    if cached:
+        return orjson.loads(cached)
+
     if not client:
         # Fallback for testing if no key is provided
         return [
@@ -28,9 +48,9 @@ async def generate_search_queries(config: SearchConfig) -> List[str]:
     prompt = f"""
     Generate 5 specific Google search queries to find companies matching:
     
-    Ind: {', '.join(config.included_industries)}
-    Loc: {', '.join(config.target_countries)}
-    Key: {', '.join(config.required_keywords)}
+    Ind: {', '.join(industries)}
+    Loc: {', '.join(countries)}
+    Key: {', '.join(keywords)}
     
     Output strictly a RAW JSON array of strings. No markdown.
     Example: ["query 1", "query 2"]
@@ -46,14 +66,14 @@ async def generate_search_queries(config: SearchConfig) -> List[str]:
         
         text_response = response.text.strip()
         
-        # Clean up if Gemini adds markdown code blocks
-        if text_response.startswith("```json"):
-            text_response = text_response.replace("```json", "").replace("```", "")
-        elif text_response.startswith("```"):
-            text_response = text_response.replace("```", "")
-            
-        queries = json.loads(text_response)
-        if isinstance(queries, list):
+        # Parse just the outermost [...] slice, which also skips any markdown fences around it
+        start, end = text_response.find("["), text_response.rfind("]")
+        if 0 <= start < end:
+            text_response = text_response[start:end + 1]
+
+        queries = orjson.loads(text_response)
+        if isinstance(queries, list) and all(isinstance(q, str) for q in queries):
+            await query_cache.set(cache_key, orjson.dumps(queries).decode())
             return queries
         else:
             return [text_response]
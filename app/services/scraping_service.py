@@ -1,100 +1,123 @@
 import os
 import sys
-import json
+import httpx
+import orjson
 import asyncio
 import logging
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured by the application at startup (see app.main.setup_logging)
 logger = logging.getLogger(__name__)
 
-async def scrape_company_websites(urls: List[str]) -> List[Dict]:
+CRAWLER_API_URL = "http://127.0.0.1:8001/scrape"
+# Max bytes per NDJSON line from the fallback scraper (a company with all its pages)
+SUBPROCESS_LINE_LIMIT = 64 * 1024 * 1024
+
+# Long-lived pool for calls to the crawler microservice; connection retries cover transient
+# connect failures. Limits live on the transport because a custom transport is passed.
+_CLIENT = httpx.AsyncClient(
+    timeout=60.0,
+    transport=httpx.AsyncHTTPTransport(
+        retries=2,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    ),
+)
+
+async def close_scraper_http():
+    await _CLIENT.aclose()
+
+async def scrape_company_websites(urls: List[str], client: Optional[httpx.AsyncClient] = None) -> AsyncIterator[Dict]:
     """
     Orchestrates the internal scraping of company websites using crawl_best logic.
     Since crawl_best is set up as a standalone script/service, we will invoke it 
     or its logic directly.
+    Yields each company's result as soon as it arrives (NDJSON from the service or the subprocess).
+    Pass a shared `client` to reuse its pooled connections; otherwise the module's pool is used.
     """
     if not urls:
-        return []
+        return
     
-    print(f"DEBUG: Internal Scraper requested for: {urls}", flush=True)
+    logger.debug("Internal Scraper requested for: %s", urls)
 
     # We will try to hit the local crawler service if it's running (as suggested by crawl_best structure)
     # OR fallback to running the scraper process directly.
     
-    CRAWLER_API_URL = "http://127.0.0.1:8001/scrape"
-    
-    import httpx
-    
-    results = []
-    
     # Attempt 1: Call Microservice
+    count = 0
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(CRAWLER_API_URL, json={"urls": urls, "max_workers": 4})
+        async with (client or _CLIENT).stream(
+            "POST", CRAWLER_API_URL, json={"urls": urls, "max_workers": 4, "stream": True}
+        ) as resp:
             if resp.status_code == 200:
-                data = resp.json()
-                print(f"DEBUG: Scraper Service returned {data.get('count')} results.", flush=True)
-                return data.get("results", [])
+                if resp.headers.get("content-type", "").startswith("application/x-ndjson"):
+                    async for line in resp.aiter_lines():
+                        if line:
+                            count += 1
+                            yield orjson.loads(line)
+                else:
+                    # Service without streaming support: one JSON body
+                    data = orjson.loads(await resp.aread())
+                    for item in data.get("results", []):
+                        count += 1
+                        yield item
+                logger.debug("Scraper Service returned %d results.", count)
+                return
     except Exception as e:
-        print(f"DEBUG: Scraper Service call failed ({e}). Attempting direct subprocess execution...", flush=True)
+        if count:
+            # Results were already handed downstream; re-running the scrape would duplicate them
+            logger.warning("Scraper Service stream broke after %d results (%s).", count, e)
+            return
+        logger.debug("Scraper Service call failed (%s). Attempting direct subprocess execution...", e)
 
     # Attempt 2: Direct Subprocess (Fallback)
     current_dir = os.getcwd()
     adapter_script = os.path.join(current_dir, "run_internal_scraper.py")
     
     if not os.path.exists(adapter_script):
-         print(f"ERROR: Adapter script not found at {adapter_script}", flush=True)
-         return []
+         logger.error("Adapter script not found at %s", adapter_script)
+         return
 
-    import tempfile
-    import subprocess
-    
-    # Create a temp file for output
-    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tf:
-        output_file = tf.name
-    
+    cmd = [sys.executable, adapter_script, "-"] + urls
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Running fallback command: %s", ' '.join(cmd))
+
+    proc = None
+    stderr_task = None
     try:
-        cmd = [sys.executable, adapter_script, output_file] + urls
-        print(f"DEBUG: Running fallback command: {' '.join(cmd)}", flush=True)
-        
-        # Run properly
+        # The adapter streams one JSON result per line on stdout; logs go to stderr
         proc = await asyncio.create_subprocess_exec(
             *cmd,
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+            stderr=asyncio.subprocess.PIPE,
+            limit=SUBPROCESS_LINE_LIMIT
         )
-        
-        stdout, stderr = await proc.communicate()
-        
-        if proc.returncode != 0:
-            print(f"DEBUG: Scraper subprocess failed: {stderr.decode()}", flush=True)
-            return []
-            
-        print(f"DEBUG: Scraper subprocess output: {stdout.decode()}", flush=True)
-        
-        # Read output
-        if os.path.exists(output_file):
+        # Drain stderr alongside stdout so a chatty crawler can't block on a full pipe
+        stderr_task = asyncio.create_task(proc.stderr.read())
+
+        async for line in proc.stdout:
+            if not line.strip():
+                continue
             try:
-                with open(output_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                    # Crawl_best format is list of dicts.
-                    if isinstance(data, list):
-                        return data
-                    elif isinstance(data, dict) and 'results' in data:
-                        return data['results']
-            except json.JSONDecodeError:
-                print("DEBUG: Failed to decode scraper JSON output.", flush=True)
+                item = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                logger.debug("Skipping non-JSON scraper line: %r", line[:200])
+                continue
+            yield item
+
+        stderr = await stderr_task
+        await proc.wait()
+
+        if proc.returncode != 0:
+            logger.warning("Scraper subprocess failed: %s", stderr.decode(errors='replace'))
     except Exception as e:
-        print(f"DEBUG: Fallback execution error: {e}", flush=True)
+        logger.warning("Fallback execution error: %s", e)
     finally:
-        # Cleanup
-        if os.path.exists(output_file):
-            try:
-                os.remove(output_file)
-            except:
-                pass
-
-    return []
+        # Consumer stopped early or something failed: don't leave the crawler running
+        if stderr_task is not None and not stderr_task.done():
+            stderr_task.cancel()
+        if proc is not None and proc.returncode is None:
+            proc.kill()
+            # Reap the child so it doesn't linger as a zombie
+            await proc.wait()
+        if stderr_task is not None:
+            await asyncio.wait({stderr_task})
@@ -1,12 +1,17 @@
-import os
-from apify_client import ApifyClientAsync
 from typing import List, Dict
 from app.models import CompanyBasicInfo
-from dotenv import load_dotenv
+from app.services.apify_shared import APIFY_API_TOKEN, run_actor_sync_items
+from app.services.url_utils import normalize_url
 
-load_dotenv()
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
-APIFY_API_TOKEN = os.getenv("APIFY_API_TOKEN")
+def url_key(url: str):
+    """Dedup key for a URL: 64-bit xxh3 of its normalized form (the string itself without xxhash)"""
+    normalized = normalize_url(url)
+    return xxhash.xxh3_64_intdigest(normalized) if xxhash else normalized
 
 async def execute_search(queries: List[str], limit_per_query: int = 5) -> List[CompanyBasicInfo]:
     """
@@ -16,50 +21,52 @@ async def execute_search(queries: List[str], limit_per_query: int = 5) -> List[C
         print("Warning: APIFY_API_TOKEN not found in environment variables.")
         return []
 
-    client = ApifyClientAsync(APIFY_API_TOKEN)
-    results_map: Dict[str, CompanyBasicInfo] = {}
+    results: List[CompanyBasicInfo] = []
+    seen_urls = set()
 
-    for query in queries:
-        try:
-            # Prepare the Actor input
-            run_input = {
-                "queries": query,
-                "resultsPerPage": limit_per_query,
-                "maxPagesPerQuery": 1,
-                "languageCode": "en",
-                "mobileResults": False,
-                "includeUnfilteredResults": False,
-                "saveHtml": False,
-                "saveHtmlToKeyValueStore": False,
-                "includeIcons": False,
-            }
+    try:
+        # Prepare the Actor input: the scraper takes newline-separated queries, so one run covers them all
+        run_input = {
+            "queries": "\n".join(queries),
+            "resultsPerPage": limit_per_query,
+            "maxPagesPerQuery": 1,
+            "languageCode": "en",
+            "mobileResults": False,
+            "includeUnfilteredResults": False,
+            "saveHtml": False,
+            "saveHtmlToKeyValueStore": False,
+            "includeIcons": False,
+        }
 
-            # Run the Actor and wait for it to finish
-            run = await client.actor("apify/google-search-scraper").call(run_input=run_input)
+        # Synchronous run: the dataset items come back in the response, no run polling
+        items = await run_actor_sync_items("apify/google-search-scraper", run_input)
+        max_results = limit_per_query * len(queries)
 
-            # Fetch and print Actor results from the run's dataset (if there are any)
-            dataset_items = await client.dataset(run["defaultDatasetId"]).list_items()
-            for item in dataset_items.items:
-                organic_results = item.get("organicResults", [])
-                
-                for result in organic_results:
-                    url = result.get("url")
-                    if not url:
-                        continue
-                        
-                    # Basic deduplication by URL
-                    if url in results_map:
-                        continue
+        # One dataset item per query page
+        for item in items:
+            if len(results) >= max_results:
+                break
+            organic_results = item.get("organicResults", [])
+            
+            for result in organic_results:
+                url = result.get("url")
+                if not url:
+                    continue
                     
-                    company = CompanyBasicInfo(
-                        name=result.get("title", "Unknown"),
-                        url=url,
-                        snippet=result.get("description", ""),
-                        source="apify"
-                    )
-                    results_map[url] = company
+                # Deduplicate on the normalized URL (tracking params, host case, trailing slash)
+                key = url_key(url)
+                if key in seen_urls:
+                    continue
+                seen_urls.add(key)
+                
+                results.append(CompanyBasicInfo(
+                    name=result.get("title", "Unknown"),
+                    url=url,
+                    snippet=result.get("description", ""),
+                    source="apify"
+                ))
 
-        except Exception as e:
-            print(f"Error searching for query in Apify '{query}': {e}")
+    except Exception as e:
+        print(f"Error searching for {len(queries)} queries in Apify: {e}")
             
-    return list(results_map.values())
+    return results
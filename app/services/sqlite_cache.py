@@ -0,0 +1,106 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+class SQLiteCache:
+    """
+    String key/value cache with per-entry TTL, persisted in a single SQLite table.
+    Disk access runs in a worker thread.
+    """
+
+    def __init__(self, path: str, ttl: int, table: str):
+        self.path = path
+        self.ttl = ttl
+        self.table = table
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> str:
+        """SHA-256 digest, for keys that are too long to store as-is (e.g. prompts)."""
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily so importing the module has no filesystem side effects
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT value FROM {self.table} WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _get_many(self, keys: list[str]) -> dict[str, str]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # Chunked to stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(conn.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders}) AND expires_at > ?",
+                    (*chunk, now),
+                ).fetchall())
+        return found
+
+    def _set_many(self, items: list[tuple[str, str]], ttl: int):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # One transaction for the whole batch
+            with conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                    [(key, value, now + ttl) for key, value in items],
+                )
+
+    def _set(self, key: str, value: str, ttl: int):
+        self._set_many([(key, value)], ttl)
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            return await asyncio.to_thread(self._get, key)
+        except sqlite3.Error as e:
+            print(f"WARN: {self.table} read failed: {e}", flush=True)
+            return None
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None):
+        try:
+            await asyncio.to_thread(self._set, key, value, ttl or self.ttl)
+        except sqlite3.Error as e:
+            print(f"WARN: {self.table} write failed: {e}", flush=True)
+
+    async def get_many(self, keys: list[str]) -> dict[str, str]:
+        """Fresh values for `keys` in one query; missing or expired keys are left out."""
+        if not keys:
+            return {}
+        try:
+            return await asyncio.to_thread(self._get_many, keys)
+        except sqlite3.Error as e:
+            print(f"WARN: {self.table} read failed: {e}", flush=True)
+            return {}
+
+    async def set_many(self, items: list[tuple[str, str]], ttl: Optional[int] = None):
+        """Writes (key, value) pairs in a single transaction."""
+        if not items:
+            return
+        try:
+            await asyncio.to_thread(self._set_many, items, ttl or self.ttl)
+        except sqlite3.Error as e:
+            print(f"WARN: {self.table} write failed: {e}", flush=True)
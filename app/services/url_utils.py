@@ -0,0 +1,19 @@
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+@lru_cache(maxsize=4096)
+def host_of(url: str) -> str:
+    """
+    Lowercased host of a URL without port or leading "www.".
+    Cached since the same base/company URLs are parsed over and over.
+    """
+    return (urlsplit(url).hostname or "").removeprefix("www.")
+
+def normalize_url(url: str) -> str:
+    """
+    Dedup form of a URL: lowercased scheme/host, utm_* params and fragment dropped,
+    trailing slash stripped from the path.
+    """
+    s = urlsplit(url.strip())
+    query = "&".join(p for p in s.query.split("&") if p and not p.startswith("utm_"))
+    return urlunsplit((s.scheme.lower(), s.netloc.lower(), s.path.rstrip("/"), query, ""))
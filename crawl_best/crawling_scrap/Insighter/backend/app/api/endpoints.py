@@ -1,9 +1,10 @@
 """
 API endpoints
 """
+import asyncio
 from typing import List
 from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
 from models.schemas import (
     CompanyAnalysisRequest, 
@@ -72,16 +73,17 @@ async def analyze_scraped(companies: List[Dict[str, Any]]):
         if not companies:
             raise HTTPException(status_code=400, detail="Provide at least one scraped company item")
 
+        created = datetime.now()
+
         # Analyze using existing analyzer
         analysis_results = await pipeline.analyzer.analyze_batch(companies)
 
         # Generate summary using pipeline helper
-        summary = pipeline._generate_summary(analysis_results)
+        summary = await asyncio.to_thread(pipeline._generate_summary, analysis_results)
 
         # Build BatchAnalysisResult
         from models.schemas import AnalysisResult
 
-        created = datetime.now()
         completed = datetime.now()
 
         return BatchAnalysisResult(
@@ -103,16 +105,13 @@ async def get_results(request_id: str):
     """
     Get analysis results by request ID
     """
-    results = pipeline.get_results(request_id)
+    results = await pipeline.get_results(request_id)
     
     if results is None:
         raise HTTPException(status_code=404, detail="Request not found")
     
     if isinstance(results, dict) and results.get('status') == 'processing':
-        return JSONResponse(
-            content=results,
-            status_code=202  # Accepted
-        )
+        return ORJSONResponse(results, status_code=202)  # Accepted
     
     return results
 
@@ -121,7 +120,7 @@ async def get_status(request_id: str):
     """
     Get analysis status
     """
-    results = pipeline.get_results(request_id)
+    results = await pipeline.get_results(request_id)
     
     if results is None:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -2,6 +2,7 @@
 Configuration settings
 """
 import os
+from importlib.util import find_spec
 from typing import Optional
 from pydantic_settings import BaseSettings
 
@@ -12,7 +13,8 @@ class Settings(BaseSettings):
     APP_NAME: str = "Company Intelligence API"
     HOST: str = "0.0.0.0"
     PORT: int = 8000
-    DEBUG: bool = True
+    DEBUG: bool = True  # dev mode: auto-reload, single worker
+    WORKERS: int = 1  # uvicorn workers when DEBUG is off; >1 needs REDIS_URL for shared request state
     
     # LLM Settings
     LLM_PROVIDER: str = "groq"  # groq or openai
@@ -30,11 +32,23 @@ class Settings(BaseSettings):
     
     # Pipeline Settings
     MAX_TOKENS_PER_ANALYSIS: int = 4000
-    BATCH_SIZE: int = 3
+    BATCH_SIZE: int = 3  # companies per batched LLM call
+    BATCH_MAX_PROMPT_TOKENS: int = 8000  # company content per batched call; larger batches are split
+    LLM_MAX_CONCURRENCY: int = 8  # max LLM calls in flight across the analyzer
+    SCRAPE_MAX_CONCURRENCY: int = 8  # max crawler-service calls in flight (also caps its per-call workers)
+    PIPELINE_WORKERS: int = 2  # background pipelines run at once; further /analyze requests wait in a queue
+    LLM_RPM: int = 30  # LLM requests per minute across the analyzer
     CACHE_RESULTS: bool = True
+    ANALYSIS_CACHE_SIZE: int = 512  # LLM analyses kept in memory, keyed by content hash
+    REDIS_URL: Optional[str] = None  # e.g. redis://localhost:6379/0; enables the shared LLM cache
+    LLM_CACHE_TTL: int = 7 * 86400  # seconds an LLM analysis stays in Redis
     
     class Config:
         env_file = ".env"
         case_sensitive = False
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
+
+# uvloop/httptools when installed: faster event loop and HTTP parsing for this I/O-bound service
+UVICORN_LOOP = "uvloop" if find_spec("uvloop") else "asyncio"
+UVICORN_HTTP = "httptools" if find_spec("httptools") else "h11"
\ No newline at end of file
@@ -3,24 +3,54 @@ FastAPI application entry point
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import logging
+import logging.handlers
+import queue
 import uvicorn
 
-from app.api.endpoints import router as api_router
-from app.config import settings
+from app.api.endpoints import router as api_router, pipeline
+from app.config import settings, UVICORN_LOOP, UVICORN_HTTP
+from utils.token_optimizer import warm_tokenizer
+
+logger = logging.getLogger("insighter")
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    Queue log records and write them from a listener thread, so logging never
+    blocks the event loop. Returns the started listener.
+    """
+    log_queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+        handlers=[logging.handlers.QueueHandler(log_queue)]
+    )
+    listener.start()
+    return listener
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup/shutdown events"""
-    print("🚀 Starting Company Intelligence Backend")
+    log_listener = setup_logging()
+    logger.info("🚀 Starting Company Intelligence Backend")
+    await warm_tokenizer()
+    pipeline.start()
     yield
-    print("🛑 Shutting down Company Intelligence Backend")
+    await pipeline.close()
+    logger.info("🛑 Shutting down Company Intelligence Backend")
+    # Flushes queued records before the process exits
+    log_listener.stop()
 
 app = FastAPI(
     title="Company Intelligence API",
     description="Intelligent company data extraction and analysis pipeline",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson serialization for every route (large BatchAnalysisResult payloads)
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -35,6 +65,13 @@ app.add_middleware(
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
 
+# Prometheus metrics (pipeline queue depth) when prometheus_client is installed
+try:
+    from prometheus_client import make_asgi_app
+    app.mount("/metrics", make_asgi_app())
+except ImportError:
+    pass
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -49,5 +86,8 @@ if __name__ == "__main__":
         "app.main:app",
         host=settings.HOST,
         port=settings.PORT,
-        reload=settings.DEBUG
+        loop=UVICORN_LOOP,
+        http=UVICORN_HTTP,
+        reload=settings.DEBUG,
+        workers=1 if settings.DEBUG else settings.WORKERS
     )
\ No newline at end of file
@@ -2,20 +2,49 @@
 Company data analyzer using LLM
 """
 import asyncio
+import hashlib
+import itertools
+import re
+import time
+from collections import Counter, OrderedDict
+from contextlib import nullcontext
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+import orjson
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    from aiolimiter import AsyncLimiter
+except ImportError:
+    AsyncLimiter = None
+
 from app.config import settings
 from utils.llm_client import LLMClient
 from utils.token_optimizer import TokenOptimizer
 from models.schemas import CompanyData, AnalysisResult
 
+def _is_word_char(c: str) -> bool:
+    # Same notion of a word character as regex \b
+    return c.isalnum() or c == '_'
+
 class CompanyAnalyzer:
     """Analyze scraped company data using LLM"""
     
     def __init__(self):
         self.llm_client = LLMClient()
         self.optimizer = TokenOptimizer()
+        # Concurrency cap plus RPM pacing for LLM calls, shared by every batch this analyzer runs
+        self._sem = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        self._limiter = AsyncLimiter(settings.LLM_RPM, 60) if AsyncLimiter else nullcontext()
+        # LLM analyses keyed by a hash of the scraped content, so identical pages skip the LLM
+        self._analysis_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
         # Simple keyword lists for extraction
         self._tech_keywords = set([
             'python','java','javascript','node.js','node','react','angular','vue','django','flask',
@@ -29,43 +58,109 @@ class CompanyAnalyzer:
             'telecom','media','entertainment','gaming','insurance','banking','energy','logistics','transport',
             'real estate','construction','agriculture'
         ])
+
+        # One automaton over both keyword lists: all occurrences are found in a single pass
+        self._automaton = None
+        if ahocorasick:
+            self._automaton = ahocorasick.Automaton()
+            for kw in self._tech_keywords:
+                self._automaton.add_word(kw, ('technologies', kw))
+            for kw in self._industry_keywords:
+                self._automaton.add_word(kw, ('industries', kw))
+            self._automaton.make_automaton()
+        else:
+            # Without pyahocorasick: one whole-word alternation over both lists, longest first
+            # so 'node.js' wins over 'node'; the automaton path applies the same rules
+            self._keyword_kind = {kw: 'industries' for kw in self._industry_keywords}
+            self._keyword_kind.update((kw, 'technologies') for kw in self._tech_keywords)
+            self._keyword_re = re.compile(
+                r'\b(?:' + '|'.join(map(re.escape, sorted(self._keyword_kind, key=len, reverse=True))) + r')\b'
+            )
     
     async def analyze_batch(self, scraped_data: List[Dict[str, Any]]) -> List[AnalysisResult]:
         """
         Analyze a batch of scraped companies
         """
-        results = []
-        
-        # Process companies in batches
-        for i in range(0, len(scraped_data), settings.BATCH_SIZE):
-            batch = scraped_data[i:i + settings.BATCH_SIZE]
-            
-            # Create analysis tasks
-            tasks = []
-            for company_data in batch:
-                task = self._analyze_single_company(company_data)
-                tasks.append(task)
-            
-            # Run batch concurrently
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            for result in batch_results:
-                if isinstance(result, Exception):
-                    results.append(AnalysisResult(
-                        url="unknown",
-                        status="failed",
-                        error=str(result),
-                        processing_time=0,
-                        tokens_used=0
-                    ))
-                else:
-                    results.append(result)
-            
-            # Add delay between batches to avoid rate limiting
-            if i + settings.BATCH_SIZE < len(scraped_data):
-                await asyncio.sleep(1)
-        
-        return results
+        analyses = await self._analyze_all_cached(scraped_data)
+
+        # Gathered so the off-loop keyword extraction for different companies overlaps
+        return await asyncio.gather(*(
+            self._build_result(company_data, analysis_result, processing_time)
+            for company_data, (analysis_result, processing_time) in zip(scraped_data, analyses)
+        ))
+
+    @staticmethod
+    def _content_key(company_data: Dict[str, Any]) -> str:
+        """Digest of the scraped content the LLM prompt is built from"""
+        payload = orjson.dumps(
+            [company_data.get('domain', ''), company_data.get('pages_content', {})],
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str
+        )
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    async def _analyze_all_cached(self, scraped_data: List[Dict[str, Any]]) -> List[tuple]:
+        """
+        LLM analysis for every company as (analysis or exception, seconds taken).
+        Content seen before is served from the cache; the rest is sent up to BATCH_SIZE
+        companies (within BATCH_MAX_PROMPT_TOKENS) per LLM call, with _sem/_limiter pacing the calls.
+        """
+        analyses: List[Optional[tuple]] = [None] * len(scraped_data)
+        pending: "OrderedDict[str, List[int]]" = OrderedDict()
+
+        for i, company_data in enumerate(scraped_data):
+            key = self._content_key(company_data)
+            cached = self._analysis_cache.get(key)
+            if cached is not None:
+                self._analysis_cache.move_to_end(key)
+                self.cache_hits += 1
+                analyses[i] = ({**cached, 'tokens_used': 0}, 0.0)
+            elif key in pending:
+                # Same content twice in this batch: analyze once, share the result
+                pending[key].append(i)
+            else:
+                self.cache_misses += 1
+                pending[key] = [i]
+
+        # Up to BATCH_SIZE companies per call, split early so the content stays under the token budget
+        size = max(1, settings.BATCH_SIZE)
+        groups: List[List[str]] = []
+        group: List[str] = []
+        group_tokens = 0
+        for key, indices in pending.items():
+            tokens = self.llm_client.estimate_prompt_tokens(scraped_data[indices[0]])
+            if group and (len(group) >= size or group_tokens + tokens > settings.BATCH_MAX_PROMPT_TOKENS):
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(key)
+            group_tokens += tokens
+        if group:
+            groups.append(group)
+
+        async def run_group(group: List[str]):
+            start_perf = time.perf_counter()
+            async with self._sem, self._limiter:
+                try:
+                    group_results = await self.llm_client.analyze_company_batch(
+                        [scraped_data[pending[k][0]] for k in group]
+                    )
+                except Exception as e:
+                    group_results = [e] * len(group)
+            elapsed = time.perf_counter() - start_perf
+
+            for key, analysis_result in zip(group, group_results):
+                # Heuristic fallbacks (no tokens spent) and failures are not worth keeping
+                if not isinstance(analysis_result, Exception) and analysis_result.get('tokens_used'):
+                    self._analysis_cache[key] = dict(analysis_result)
+                    if len(self._analysis_cache) > settings.ANALYSIS_CACHE_SIZE:
+                        self._analysis_cache.popitem(last=False)
+                first, *dupes = pending[key]
+                analyses[first] = (analysis_result, elapsed)
+                for i in dupes:
+                    shared = analysis_result if isinstance(analysis_result, Exception) else {**analysis_result, 'tokens_used': 0}
+                    analyses[i] = (shared, elapsed)
+
+        await asyncio.gather(*(run_group(g) for g in groups))
+        return analyses
 
     def _extract_keywords(self, text: str) -> Dict[str, List[str]]:
         """Simple keyword extractor: find tech and industry keywords by frequency."""
@@ -73,37 +168,60 @@ class CompanyAnalyzer:
             return {'technologies': [], 'industries': []}
 
         txt = text.lower()
-        # count occurrences
-        tech_counts = {}
-        for kw in self._tech_keywords:
-            if kw in txt:
-                tech_counts[kw] = txt.count(kw)
-
-        industry_counts = {}
-        for kw in self._industry_keywords:
-            if kw in txt:
-                industry_counts[kw] = txt.count(kw)
-
-        # sort by frequency
-        techs = [k for k, v in sorted(tech_counts.items(), key=lambda x: x[1], reverse=True)]
-        industries = [k for k, v in sorted(industry_counts.items(), key=lambda x: x[1], reverse=True)]
-
-        return {'technologies': techs, 'industries': industries}
+        # count whole-word occurrences (so 'go' in 'google' or 'ai' in 'said' don't count)
+        counts = {'technologies': Counter(), 'industries': Counter()}
+        if self._automaton:
+            # Whole-word hits, then leftmost-longest without overlaps, as the regex alternation matches
+            n = len(txt)
+            hits = []
+            for end, (kind, kw) in self._automaton.iter(txt):
+                start = end - len(kw) + 1
+                if (start == 0 or not _is_word_char(txt[start - 1])) and (end + 1 == n or not _is_word_char(txt[end + 1])):
+                    hits.append((start, -end, kind, kw))
+            hits.sort()
+            last_end = -1
+            for start, neg_end, kind, kw in hits:
+                if start > last_end:
+                    counts[kind][kw] += 1
+                    last_end = -neg_end
+        else:
+            for m in self._keyword_re.finditer(txt):
+                kw = m.group()
+                counts[self._keyword_kind[kw]][kw] += 1
+
+        # sort by frequency, ties alphabetically so both match paths give the same order
+        return {
+            kind: [k for k, _ in sorted(kw_counts.items(), key=lambda kv: (-kv[1], kv[0]))]
+            for kind, kw_counts in counts.items()
+        }
     
-    async def _analyze_single_company(self, company_data: Dict[str, Any]) -> AnalysisResult:
+    @staticmethod
+    def _failed_result(company_data: Dict[str, Any], error: Exception, processing_time: float) -> AnalysisResult:
+        return AnalysisResult(
+            url=company_data.get('original_url', ''),
+            status="failed",
+            data=None,
+            error=str(error),
+            processing_time=processing_time,
+            tokens_used=0
+        )
+
+    async def _build_result(self, company_data: Dict[str, Any], analysis_result: Any,
+                            processing_time: float) -> AnalysisResult:
         """
-        Analyze a single company
+        Turn one company's LLM analysis (or the exception it raised) into an AnalysisResult
         """
-        start_time = datetime.now()
+        if isinstance(analysis_result, Exception):
+            return self._failed_result(company_data, analysis_result, processing_time)
+
+        start_perf = time.perf_counter()
         
         try:
-            # Call LLM for analysis
-            analysis_result = await self.llm_client.analyze_company(company_data)
-            
             # Extract tokens used
             tokens_used = analysis_result.pop('tokens_used', 0)
             
             # Convert to CompanyData schema
+            now = datetime.now()
             company_data_obj = CompanyData(
                 company_name=analysis_result.get('company_name', 'Unknown'),
                 domain=company_data.get('domain', ''),
@@ -124,8 +242,8 @@ class CompanyAnalyzer:
                 opportunities=analysis_result.get('opportunities', []),
                 sentiment_score=float(analysis_result.get('sentiment_score', 0)),
                 confidence_score=float(analysis_result.get('confidence_score', 0)),
-                scraped_at=datetime.now(),
-                analyzed_at=datetime.now()
+                scraped_at=now,
+                analyzed_at=now
             )
 
             # If LLM returned low-confidence or was a fallback, create a local synthesis
@@ -137,10 +255,14 @@ class CompanyAnalyzer:
                 title = homepage.get('title') or ''
                 paragraphs = homepage.get('paragraphs', []) or []
                 lists = homepage.get('list_items', []) or []
-                full_text = (homepage.get('full_text', '') or '') + ' ' + ' '.join(paragraphs[:5]) + ' ' + ' '.join(lists[:10])
+                # One join instead of chained concatenations (full_text can be hundreds of KB)
+                full_text = ' '.join(itertools.chain(
+                    (homepage.get('full_text') or '',), paragraphs[:5], map(str, lists[:10])
+                ))
 
                 # Extract technology and industry keywords
-                keywords = self._extract_keywords(full_text)
+                # CPU-bound scan over possibly large text: keep it off the event loop
+                keywords = await asyncio.to_thread(self._extract_keywords, full_text)
                 techs = keywords.get('technologies', [])
                 industries = keywords.get('industries', [])
 
@@ -179,7 +301,7 @@ class CompanyAnalyzer:
                 company_data_obj.llm_synthesis = synthesis
                 company_data_obj.llm_raw = analysis_result
             
-            processing_time = (datetime.now() - start_time).total_seconds()
+            processing_time += time.perf_counter() - start_perf
             
             return AnalysisResult(
                 url=company_data.get('original_url', ''),
@@ -191,13 +313,4 @@ class CompanyAnalyzer:
             )
             
         except Exception as e:
-            processing_time = (datetime.now() - start_time).total_seconds()
-            
-            return AnalysisResult(
-                url=company_data.get('original_url', ''),
-                status="failed",
-                data=None,
-                error=str(e),
-                processing_time=processing_time,
-                tokens_used=0
-            )
\ No newline at end of file
+            return self._failed_result(company_data, e, processing_time + time.perf_counter() - start_perf)
\ No newline at end of file
@@ -1,7 +1,50 @@
 """
 Company filtering system
 """
-from typing import List, Dict, Any
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional
+
+@dataclass(frozen=True, slots=True)
+class _Filters:
+    """Filter criteria lowercased once per apply_filters call (None = filter not requested)"""
+    industries: Optional[frozenset]
+    employee_sizes: Optional[frozenset]
+    technologies: Optional[frozenset]
+    certifications: Optional[frozenset]
+    min_confidence: Optional[float]
+
+    @classmethod
+    def compile(cls, filters: Dict[str, Any]) -> "_Filters":
+        def lowered(key: str) -> Optional[frozenset]:
+            return frozenset(map(str.lower, filters[key])) if key in filters else None
+
+        return cls(
+            industries=lowered('industries'),
+            employee_sizes=lowered('employee_size'),
+            technologies=lowered('technologies'),
+            certifications=lowered('certifications'),
+            min_confidence=filters.get('min_confidence'),
+        )
+
+@dataclass(frozen=True, slots=True)
+class NormalizedCompany:
+    """Lowercased filterable AI fields of one company, kept beside (not on) its scraped dict"""
+    industries: frozenset
+    technologies: frozenset
+    certifications: frozenset
+
+def normalize_company(company: Dict[str, Any]) -> NormalizedCompany:
+    """Lowercase the filterable ai_extracted_data list fields once per company"""
+    ai_data = company.get('ai_extracted_data') or {}
+
+    def lowered(field: str) -> frozenset:
+        return frozenset(str(v).lower() for v in ai_data.get(field) or ())
+
+    return NormalizedCompany(
+        industries=lowered('industry'),
+        technologies=lowered('technology_stack'),
+        certifications=lowered('certifications'),
+    )
 
 class CompanyFilter:
     """Filter companies based on criteria"""
@@ -11,56 +54,42 @@ class CompanyFilter:
         if not filters:
             return companies
         
-        filtered = []
-        
-        for company in companies:
-            if self._matches_filters(company, filters):
-                filtered.append(company)
-        
-        return filtered
+        compiled = _Filters.compile(filters)
+        # Normalized views live only for this call; the scraped dicts are left untouched
+        return [company for company in companies if self._matches_filters(company, normalize_company(company), compiled)]
     
-    def _matches_filters(self, company: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    def _matches_filters(self, company: Dict[str, Any], normalized: NormalizedCompany, filters: _Filters) -> bool:
         """Check if company matches all filters"""
         
         # Extract AI data if available
         ai_data = company.get('ai_extracted_data', {})
         
-        # Industry filter
-        if 'industries' in filters:
-            company_industries = set(i.lower() for i in ai_data.get('industry', []))
-            required_industries = set(i.lower() for i in filters['industries'])
-            
-            if not company_industries.intersection(required_industries):
+        # Industry filter (isdisjoint stops at the first overlap)
+        if filters.industries is not None:
+            if filters.industries.isdisjoint(normalized.industries):
                 return False
         
         # Employee size filter
-        if 'employee_size' in filters:
+        if filters.employee_sizes is not None:
             company_size = ai_data.get('employee_size', '').lower()
-            required_sizes = [s.lower() for s in filters['employee_size']]
             
-            if company_size not in required_sizes and company_size != 'unknown':
+            if company_size not in filters.employee_sizes and company_size != 'unknown':
                 return False
         
         # Technology filter
-        if 'technologies' in filters:
-            company_tech = set(t.lower() for t in ai_data.get('technology_stack', []))
-            required_tech = set(t.lower() for t in filters['technologies'])
-            
-            if not company_tech.intersection(required_tech):
+        if filters.technologies is not None:
+            if filters.technologies.isdisjoint(normalized.technologies):
                 return False
         
         # Certification filter
-        if 'certifications' in filters:
-            company_certs = set(c.lower() for c in ai_data.get('certifications', []))
-            required_certs = set(c.lower() for c in filters['certifications'])
-            
-            if not company_certs.intersection(required_certs):
+        if filters.certifications is not None:
+            if filters.certifications.isdisjoint(normalized.certifications):
                 return False
         
         # Confidence score filter
-        if 'min_confidence' in filters:
+        if filters.min_confidence is not None:
             confidence = float(ai_data.get('confidence_score', 0))
-            if confidence < filters['min_confidence']:
+            if confidence < filters.min_confidence:
                 return False
         
-        return True
\ No newline at end of file
+        return True
@@ -2,14 +2,28 @@
 Main pipeline orchestrator
 """
 import asyncio
+import logging
 import uuid
+from collections import Counter
+from itertools import chain
 from typing import List, Dict, Any
 from datetime import datetime
 
-from models.schemas import CompanyAnalysisRequest, CompanyAnalysisResponse, BatchAnalysisResult
+from app.config import settings
+from models.schemas import CompanyAnalysisRequest, CompanyAnalysisResponse, BatchAnalysisResult, AnalysisResult
 from core.scraper import CompanyScraper
 from core.analyzer import CompanyAnalyzer
 from core.filter import CompanyFilter
+from core.results_store import ResultsStore
+from utils.redis_client import redis_client
+
+logger = logging.getLogger("insighter.pipeline")
+
+try:
+    from prometheus_client import Gauge
+    QUEUE_DEPTH = Gauge("insighter_pipeline_queue_depth", "Analysis requests waiting for a pipeline worker")
+except ImportError:
+    QUEUE_DEPTH = None
 
 class AnalysisPipeline:
     """Orchestrate the entire analysis pipeline"""
@@ -19,8 +33,52 @@ class AnalysisPipeline:
         self.analyzer = CompanyAnalyzer()
         self.filter = CompanyFilter()
         
-        # In-memory store for results (use Redis in production)
-        self.results_store = {}
+        # Request state: Redis when REDIS_URL is configured, else in-memory
+        self.results_store = ResultsStore()
+        
+        # Background requests are queued and drained by a fixed pool of workers
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        """Spawn the pipeline workers (idempotent)"""
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker(), name=f"pipeline-worker-{i}")
+                for i in range(settings.PIPELINE_WORKERS)
+            ]
+
+    async def _worker(self):
+        while True:
+            request_id, request = await self._queue.get()
+            if QUEUE_DEPTH is not None:
+                QUEUE_DEPTH.set(self._queue.qsize())
+            try:
+                await self._run_pipeline(request_id, request)
+            except Exception as e:
+                # Keep the worker alive; the pipeline's own failure handling can itself fail (e.g. Redis down)
+                logger.exception("❌ Pipeline worker error for request %s", request_id, extra={"request_id": request_id})
+                try:
+                    await self.results_store.update(request_id, {
+                        'status': 'failed',
+                        'completed_at': datetime.now(),
+                        'error': str(e)
+                    })
+                except Exception:
+                    logger.exception("❌ Could not mark request %s failed", request_id, extra={"request_id": request_id})
+            finally:
+                self._queue.task_done()
+
+    async def close(self):
+        """Stop workers and release pooled connections (called on app shutdown)"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.scraper.close()
+        await self.analyzer.llm_client.aclose()
+        if redis_client is not None:
+            await redis_client.aclose()
     
     async def process_request(self, request: CompanyAnalysisRequest) -> CompanyAnalysisResponse:
         """
@@ -40,16 +98,19 @@ class AnalysisPipeline:
         )
         
         # Store initial state
-        self.results_store[request_id] = {
+        await self.results_store.update(request_id, {
             'request': request.dict(),
             'status': 'processing',
             'created_at': datetime.now(),
             'results': [],
             'summary': {}
-        }
+        })
         
-        # Run pipeline in background
-        asyncio.create_task(self._run_pipeline(request_id, request))
+        # Queue for a background worker; at most PIPELINE_WORKERS pipelines run at once
+        self.start()
+        await self._queue.put((request_id, request))
+        if QUEUE_DEPTH is not None:
+            QUEUE_DEPTH.set(self._queue.qsize())
         
         return response
 
@@ -60,19 +121,19 @@ class AnalysisPipeline:
         request_id = str(uuid.uuid4())
 
         # Store initial state
-        self.results_store[request_id] = {
+        await self.results_store.update(request_id, {
             'request': request.dict(),
             'status': 'processing',
             'created_at': datetime.now(),
             'results': [],
             'summary': {}
-        }
+        })
 
         # Execute the pipeline synchronously (await completion)
         await self._run_pipeline(request_id, request)
 
         # After completion, return BatchAnalysisResult via get_results
-        results = self.get_results(request_id)
+        results = await self.get_results(request_id)
         return results
     
     async def _run_pipeline(self, request_id: str, request: CompanyAnalysisRequest):
@@ -81,37 +142,40 @@ class AnalysisPipeline:
         """
         try:
             # Step 1: Scrape company websites
-            print(f"📥 Step 1: Scraping {len(request.urls)} companies")
+            logger.info("📥 Step 1: Scraping %d companies", len(request.urls), extra={"request_id": request_id})
             scraped_data = await self.scraper.scrape_companies(request.urls)
             
             # Step 2: Apply filters if provided
             if request.filters:
-                print(f"🔍 Step 2: Applying filters")
+                logger.info("🔍 Step 2: Applying filters", extra={"request_id": request_id})
                 filtered_data = self.filter.apply_filters(scraped_data, request.filters)
             else:
                 filtered_data = scraped_data
             
             # Step 3: Analyze with LLM
-            print(f"🤖 Step 3: Analyzing {len(filtered_data)} companies with LLM")
+            logger.info("🤖 Step 3: Analyzing %d companies with LLM", len(filtered_data), extra={"request_id": request_id})
             analysis_results = await self.analyzer.analyze_batch(filtered_data)
             
             # Step 4: Generate summary
-            print(f"📊 Step 4: Generating summary")
-            summary = self._generate_summary(analysis_results)
+            logger.info("📊 Step 4: Generating summary", extra={"request_id": request_id})
+            summary = await asyncio.to_thread(self._generate_summary, analysis_results)
             
             # Update results store
-            self.results_store[request_id].update({
+            # Models are packed once by the store; counts are taken once, here
+            await self.results_store.update(request_id, {
                 'status': 'completed',
                 'completed_at': datetime.now(),
-                'results': [r.dict() for r in analysis_results],
+                'results': analysis_results,
+                'successful': sum(1 for r in analysis_results if r.status == 'success'),
+                'failed': sum(1 for r in analysis_results if r.status == 'failed'),
                 'summary': summary
             })
             
-            print(f"✅ Pipeline completed for request {request_id}")
+            logger.info("✅ Pipeline completed for request %s", request_id, extra={"request_id": request_id})
             
         except Exception as e:
-            print(f"❌ Pipeline failed for request {request_id}: {str(e)}")
-            self.results_store[request_id].update({
+            logger.error("❌ Pipeline failed for request %s: %s", request_id, e, extra={"request_id": request_id})
+            await self.results_store.update(request_id, {
                 'status': 'failed',
                 'completed_at': datetime.now(),
                 'error': str(e)
@@ -119,72 +183,71 @@ class AnalysisPipeline:
     
     def _generate_summary(self, results: List) -> Dict[str, Any]:
         """Generate analysis summary"""
-        successful = [r for r in results if r.status == 'success']
-        failed = [r for r in results if r.status == 'failed']
+        # Single pass for status counts and totals; distributions are counted in C below
+        failed = 0
+        conf_sum = sent_sum = 0.0
+        tok_sum = 0
+        pt_sum = 0.0
+        ok = []
+        
+        for r in results:
+            tok_sum += r.tokens_used
+            pt_sum += r.processing_time
+            if r.status == 'success':
+                data = r.data
+                ok.append(data)
+                conf_sum += data.confidence_score
+                sent_sum += data.sentiment_score
+            elif r.status == 'failed':
+                failed += 1
         
+        successful = len(ok)
         if not successful:
             return {'error': 'No successful analyses'}
         
-        # Calculate averages
-        avg_confidence = sum(r.data.confidence_score for r in successful) / len(successful)
-        avg_sentiment = sum(r.data.sentiment_score for r in successful) / len(successful)
-        
-        # Industry distribution
-        industries = {}
-        for r in successful:
-            for industry in r.data.industry:
-                industries[industry] = industries.get(industry, 0) + 1
-        
-        # Company size distribution
-        sizes = {}
-        for r in successful:
-            size = r.data.employee_size
-            sizes[size] = sizes.get(size, 0) + 1
-        
-        # Business model distribution
-        business_models = {}
-        for r in successful:
-            model = r.data.business_model
-            business_models[model] = business_models.get(model, 0) + 1
+        industries = Counter(chain.from_iterable(d.industry for d in ok))
+        sizes = Counter(d.employee_size for d in ok)
+        business_models = Counter(d.business_model for d in ok)
         
         return {
             'total_companies': len(results),
-            'successful': len(successful),
-            'failed': len(failed),
-            'avg_confidence_score': round(avg_confidence, 2),
-            'avg_sentiment_score': round(avg_sentiment, 2),
-            'total_tokens_used': sum(r.tokens_used for r in results),
-            'avg_processing_time': sum(r.processing_time for r in results) / len(results),
-            'industry_distribution': dict(sorted(industries.items(), key=lambda x: x[1], reverse=True)[:5]),
-            'company_size_distribution': sizes,
-            'business_model_distribution': business_models
+            'successful': successful,
+            'failed': failed,
+            'avg_confidence_score': round(conf_sum / successful, 2),
+            'avg_sentiment_score': round(sent_sum / successful, 2),
+            'total_tokens_used': tok_sum,
+            'avg_processing_time': pt_sum / len(results),
+            'industry_distribution': dict(industries.most_common(5)),
+            'company_size_distribution': dict(sizes),
+            'business_model_distribution': dict(business_models),
+            # Process-lifetime counters of the shared (Redis) LLM cache
+            'llm_cache': {
+                'hits': self.analyzer.llm_client.cache_hits,
+                'misses': self.analyzer.llm_client.cache_misses
+            }
         }
     
-    def get_results(self, request_id: str) -> Dict[str, Any]:
+    async def get_results(self, request_id: str) -> Dict[str, Any]:
         """Get results by request ID"""
-        if request_id not in self.results_store:
+        result_data = await self.results_store.get(request_id)
+        if result_data is None:
             return None
         
-        result_data = self.results_store[request_id]
-        
         if result_data['status'] == 'processing':
             return {'status': 'processing', 'message': 'Analysis in progress'}
         
         # Create BatchAnalysisResult
         if result_data['status'] == 'completed':
-            from models.schemas import AnalysisResult
-            
-            results = []
-            for r in result_data['results']:
-                results.append(AnalysisResult(**r))
+            # Stored packed; validate the decoded dicts straight into models
+            results = [AnalysisResult.model_validate(r) for r in result_data['results']]
             
             return BatchAnalysisResult(
                 request_id=request_id,
                 created_at=result_data['created_at'],
                 completed_at=result_data['completed_at'],
                 total_companies=len(results),
-                successful=sum(1 for r in results if r.status == 'success'),
-                failed=sum(1 for r in results if r.status == 'failed'),
+                successful=result_data['successful'],
+                failed=result_data['failed'],
                 results=results,
                 summary=result_data['summary']
             )
@@ -0,0 +1,82 @@
+"""
+Per-request pipeline state, in Redis when configured so every worker sees it
+"""
+import orjson
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from utils.redis_client import redis_client
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RESULTS_TTL = 86400  # seconds a request's state is kept in Redis
+
+# Fields are kept as compact bytes (msgpack, zstd-compressed when available) rather than nested dicts
+_compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+def _default(obj: Any):
+    # Pydantic models (e.g. AnalysisResult) are stored as their JSON-mode dump
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump(mode='json')
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return str(obj)
+
+def _pack(value: Any) -> bytes:
+    if msgpack is not None:
+        buf = msgpack.packb(value, default=_default, use_bin_type=True)
+    else:
+        buf = orjson.dumps(value, default=_default)
+    return _compressor.compress(buf) if _compressor else buf
+
+def _unpack(buf: bytes) -> Any:
+    if _decompressor:
+        buf = _decompressor.decompress(buf)
+    if msgpack is not None:
+        return msgpack.unpackb(buf, raw=False)
+    return orjson.loads(buf)
+
+class ResultsStore:
+    """Request state as a dict of packed fields; a Redis hash per request, or an in-process dict"""
+
+    def __init__(self, redis=redis_client, ttl: int = RESULTS_TTL):
+        self._redis = redis
+        self._ttl = ttl
+        self._local: Dict[str, Dict[str, bytes]] = {}
+
+    @staticmethod
+    def _key(request_id: str) -> str:
+        return f"req:{request_id}"
+
+    async def update(self, request_id: str, fields: Dict[str, Any]):
+        """Create or update fields of a request's state"""
+        packed = {k: _pack(v) for k, v in fields.items()}
+        if self._redis is None:
+            self._local.setdefault(request_id, {}).update(packed)
+            return
+
+        # One round trip: HSET of every field plus the TTL refresh
+        key = self._key(request_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=packed)
+            pipe.expire(key, self._ttl)
+            await pipe.execute()
+
+    async def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        if self._redis is None:
+            raw = self._local.get(request_id)
+            return {k: _unpack(v) for k, v in raw.items()} if raw else None
+
+        raw = await self._redis.hgetall(self._key(request_id))
+        if not raw:
+            return None
+        return {k.decode(): _unpack(v) for k, v in raw.items()}
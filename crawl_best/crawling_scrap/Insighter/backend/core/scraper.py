@@ -2,16 +2,18 @@
 Scraper module using existing IntelligentCompanyCrawler
 """
 import asyncio
-import subprocess
-import json
-import tempfile
-import os
+import logging
 from typing import List, Dict, Any
 from datetime import datetime
+from importlib.util import find_spec
+
+import httpx
+import orjson
 
 from app.config import settings
 from utils.token_optimizer import TokenOptimizer
-import requests
+
+logger = logging.getLogger("insighter.scraper")
 
 
 class CompanyScraper:
@@ -19,6 +21,24 @@ class CompanyScraper:
     
     def __init__(self):
         self.optimizer = TokenOptimizer()
+        # Pooled client: keep-alive connections to the crawler service are reused across batches
+        self._client = httpx.AsyncClient(
+            timeout=settings.SCRAPE_TIMEOUT + 10,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            # httpx can only decode br when the brotli package is present
+            headers={"Accept-Encoding": "br, gzip" if find_spec("brotli") else "gzip"}
+        )
+        # Bounds concurrent batches hitting the crawler service across pipeline runs
+        self._sem = asyncio.Semaphore(settings.SCRAPE_MAX_CONCURRENCY)
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
     
     async def scrape_companies(self, urls: List[str]) -> List[Dict[str, Any]]:
         """
@@ -31,77 +51,57 @@ class CompanyScraper:
                 url = 'https://' + url
             formatted_urls.append(url)
         
-        # Create temporary output file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as tmp:
-            output_file = tmp.name
-        
-        try:
-            # Run the scraper (using existing code)
-            # We'll use subprocess to run the scraper
-            # In production, you might want to integrate directly
-            
-            # For now, we'll use a simplified approach
-            # You can integrate the existing scraper code here
-            
-            # Call the lightweight crawler FastAPI service to scrape pages
-            print(f"🔍 Scraping {len(formatted_urls)} companies via crawler service {settings.CRAWLER_API_URL}...")
+        # Call the lightweight crawler FastAPI service to scrape pages
+        logger.info("🔍 Scraping %d companies via crawler service %s...", len(formatted_urls), settings.CRAWLER_API_URL)
 
-            try:
-                resp = requests.post(
+        try:
+            async with self._sem:
+                resp = await self._client.post(
                     settings.CRAWLER_API_URL,
                     json={
                         'urls': formatted_urls,
                         'timeout': settings.SCRAPE_TIMEOUT,
-                        'max_workers': min(8, len(formatted_urls))
-                    },
-                    timeout=settings.SCRAPE_TIMEOUT + 10
+                        'max_workers': min(settings.SCRAPE_MAX_CONCURRENCY, len(formatted_urls))
+                    }
                 )
 
-                resp.raise_for_status()
-                payload = resp.json()
-                results = payload.get('results', [])
+            resp.raise_for_status()
+            payload = orjson.loads(resp.content)
+            results = payload.get('results', [])
 
-                # Transform results into expected scraped_data format
-                scraped_data = []
-                for r in results:
-                    company = {
-                        'domain': r.get('domain') or r.get('url', '').split('//')[-1].split('/')[0],
-                        'original_url': r.get('url'),
-                        'pages_content': {
-                            'homepage': {
-                                'title': r.get('title'),
-                                'headings': r.get('headings', {}),
-                                'paragraphs': r.get('paragraphs', []),
-                                'list_items': r.get('list_items', []),
-                                'specific_data': {
-                                    'emails': r.get('emails', []),
-                                    'phones': r.get('phones', [])
-                                },
-                                'full_text': r.get('full_text', '')
-                            }
+            # Transform results into expected scraped_data format
+            scraped_data = []
+            for r in results:
+                company = {
+                    'domain': r.get('domain') or r.get('url', '').split('//')[-1].split('/')[0],
+                    'original_url': r.get('url'),
+                    'pages_content': {
+                        'homepage': {
+                            'title': r.get('title'),
+                            'headings': r.get('headings', {}),
+                            'paragraphs': r.get('paragraphs', []),
+                            'list_items': r.get('list_items', []),
+                            'specific_data': {
+                                'emails': r.get('emails', []),
+                                'phones': r.get('phones', [])
+                            },
+                            'full_text': r.get('full_text', '')
                         }
                     }
-                    if r.get('error'):
-                        company['error'] = r.get('error')
-                    scraped_data.append(company)
+                }
+                if r.get('error'):
+                    company['error'] = r.get('error')
+                scraped_data.append(company)
 
-            except Exception as e:
-                print(f"✗ Crawler service call failed: {e}")
-                # Fallback to mock scrape
-                scraped_data = await self._mock_scrape(formatted_urls)
-            
-            # Optimize scraped data
-            optimized_data = []
-            for data in scraped_data:
-                optimized = self.optimizer.extract_key_content(data)
-                optimized_data.append(optimized)
-            
-            return optimized_data
-            
-        finally:
-            # Cleanup
-            if os.path.exists(output_file):
-                os.unlink(output_file)
+        except Exception as e:
+            logger.warning("✗ Crawler service call failed: %s", e)
+            # Fallback to mock scrape
+            scraped_data = await self._mock_scrape(formatted_urls)
+        
+        # Optimize scraped data (off the event loop: pure CPU work over every page)
+        return await asyncio.to_thread(
+            lambda: [self.optimizer.extract_key_content(data) for data in scraped_data]
+        )
     
     async def _mock_scrape(self, urls: List[str]) -> List[Dict[str, Any]]:
         """Mock scraping for testing"""
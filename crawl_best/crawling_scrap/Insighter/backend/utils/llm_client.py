@@ -2,10 +2,128 @@
 LLM client for Groq/OpenAI API
 """
 import os
-import json
+import asyncio
+import logging
+import hashlib
+from importlib.util import find_spec
 from typing import Dict, Any, List, Optional
 import httpx
+import orjson
 from app.config import settings
+from utils.redis_client import redis_client
+from utils.token_optimizer import TokenOptimizer
+
+logger = logging.getLogger("insighter.llm")
+
+# Per-company output structure and rules (part of the system message)
+ANALYSIS_FIELDS = """{
+  "company_name": "Full company name (if available, otherwise use domain)",
+  "description": "Brief company description (1-2 sentences max)",
+  "industry": ["primary industry", "secondary industry (if clear)"],
+  "employee_size": "Estimate: 1-10, 11-50, 51-200, 201-500, 501-1000, 1000+, unknown",
+  "founded_year": "Year or unknown",
+  "headquarters": "City, Country or unknown",
+  "revenue_range": "Estimate: <$1M, $1M-$10M, $10M-$50M, $50M-$100M, $100M-$500M, $500M-$1B, $1B+, unknown",
+  "business_model": "SaaS, Marketplace, E-commerce, Consulting, Services, Product, Other",
+  "target_market": ["B2B", "B2C", "Both"],
+  "products_services": ["List main products/services (max 10)"],
+  "technology_stack": ["Technologies mentioned (max 8)"],
+  "certifications": ["ISO, SOC, HIPAA, etc if mentioned"],
+  "key_clients": ["Mentioned clients or partners (max 5)"],
+  "competitive_advantage": ["Key differentiators (max 3)"],
+  "risks": ["Potential risks/weaknesses (max 3)"],
+  "opportunities": ["Growth opportunities (max 3)"],
+  "sentiment_score": "Number from -1 (negative) to 1 (positive)",
+  "confidence_score": "Number from 0 (low) to 1 (high) based on data availability"
+}"""
+
+ANALYSIS_RULES = """Rules:
+1. Only include information you can find in the provided content
+2. Use "unknown" if information is not available
+3. Be conservative with confidence_score
+4. Return ONLY valid JSON, no other text
+5. Keep arrays concise (max items as specified)
+6. Sentiment: analyze tone of content (positive/neutral/negative)"""
+
+# Everything static lives in the system message: one stable prefix the provider can cache,
+# with only the company content in the user message
+SYSTEM_PROMPT = f"""You are a company intelligence analyst. Extract and analyze structured information 
+from scraped company data. Be concise, accurate, and focus on key business insights.
+
+For each company, extract the following information as a JSON object:
+
+{ANALYSIS_FIELDS}
+
+{ANALYSIS_RULES}"""
+
+# Constant part of the heuristic (no-LLM) analysis; copied per company. Empty lists are
+# tuples so a shallow copy can't leak mutations between results.
+_FALLBACK_TEMPLATE = {
+    'company_name': '',
+    'description': '',
+    'industry': (),
+    'employee_size': 'unknown',
+    'founded_year': None,
+    'headquarters': 'unknown',
+    'revenue_range': 'unknown',
+    'business_model': 'Other',
+    'target_market': (),
+    'products_services': (),
+    'technology_stack': (),
+    'certifications': (),
+    'key_clients': (),
+    'competitive_advantage': (),
+    'risks': (),
+    'opportunities': (),
+    'sentiment_score': 0.0,
+    'confidence_score': 0.0,
+    'tokens_used': 0
+}
+
+# JSON Schemas for structured output (response_format json_schema) on providers that support it
+_STR = {"type": "string"}
+_NULLABLE_STR = {"type": ["string", "null"]}
+_STR_LIST = {"type": "array", "items": _STR}
+_COMPANY_PROPERTIES = {
+    "company_name": _STR,
+    "description": _STR,
+    "industry": _STR_LIST,
+    "employee_size": _STR,
+    "founded_year": _NULLABLE_STR,
+    "headquarters": _STR,
+    "revenue_range": _NULLABLE_STR,
+    "business_model": _STR,
+    "target_market": _STR_LIST,
+    "products_services": _STR_LIST,
+    "technology_stack": _STR_LIST,
+    "certifications": _STR_LIST,
+    "key_clients": _STR_LIST,
+    "competitive_advantage": _STR_LIST,
+    "risks": _STR_LIST,
+    "opportunities": _STR_LIST,
+    "sentiment_score": {"type": "number"},
+    "confidence_score": {"type": "number"},
+}
+COMPANY_SCHEMA = {
+    "type": "object",
+    "properties": _COMPANY_PROPERTIES,
+    "required": list(_COMPANY_PROPERTIES),
+    "additionalProperties": False,
+}
+# Batch items echo the id of the company they describe, so replies are matched by id, not position
+_COMPANY_BATCH_ITEM_PROPERTIES = {"id": {"type": "integer"}, **_COMPANY_PROPERTIES}
+COMPANY_BATCH_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": _COMPANY_BATCH_ITEM_PROPERTIES,
+    "required": list(_COMPANY_BATCH_ITEM_PROPERTIES),
+    "additionalProperties": False,
+}
+COMPANY_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {"companies": {"type": "array", "items": COMPANY_BATCH_ITEM_SCHEMA}},
+    "required": ["companies"],
+    "additionalProperties": False,
+}
 
 class LLMClient:
     """Client for LLM API calls"""
@@ -13,6 +131,10 @@ class LLMClient:
     def __init__(self):
         self.provider = settings.LLM_PROVIDER
         self.model = settings.LLM_MODEL
+        # Shared LLM result cache (only when redis is installed and REDIS_URL is set)
+        self._redis = redis_client
+        self.cache_hits = 0
+        self.cache_misses = 0
         self.setup_client()
     
     def setup_client(self):
@@ -33,10 +155,83 @@ class LLMClient:
             }
         else:
             raise ValueError(f"Unsupported LLM provider: {self.provider}")
+
+        # Server-side schema validation; Groq's default models only support json_object mode
+        self.supports_json_schema = self.provider == "openai"
+
+        # One pooled client per LLMClient: calls reuse keep-alive (HTTP/2 when h2 is installed) connections
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            http2=find_spec("h2") is not None,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def _cache_key(self, prompt: str) -> str:
+        return "llm:" + hashlib.sha256((self.model + SYSTEM_PROMPT + prompt).encode()).hexdigest()
+
+    async def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached analysis (tokens_used zeroed), or None; Redis trouble counts as a miss"""
+        if self._redis is None:
+            return None
+        try:
+            cached = await self._redis.get(key)
+        except Exception as e:
+            logger.warning("⚠️ LLM cache read failed: %s", e)
+            cached = None
+        if cached is None:
+            self.cache_misses += 1
+            return None
+        self.cache_hits += 1
+        return {**orjson.loads(cached), 'tokens_used': 0}
+
+    async def _cache_get_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """_cache_get for several keys in one MGET round trip"""
+        if self._redis is None:
+            return [None] * len(keys)
+        try:
+            values = await self._redis.mget(keys)
+        except Exception as e:
+            logger.warning("⚠️ LLM cache read failed: %s", e)
+            values = [None] * len(keys)
+        results = []
+        for cached in values:
+            if cached is None:
+                self.cache_misses += 1
+                results.append(None)
+            else:
+                self.cache_hits += 1
+                results.append({**orjson.loads(cached), 'tokens_used': 0})
+        return results
+
+    async def _cache_set(self, key: str, analysis_result: Dict[str, Any]):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(key, orjson.dumps(analysis_result), ex=settings.LLM_CACHE_TTL)
+        except Exception as e:
+            logger.warning("⚠️ LLM cache write failed: %s", e)
     
-    async def analyze_company(self, scraped_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _cache_set_many(self, entries: List[tuple]):
+        """_cache_set for several (key, analysis) pairs in one pipelined round trip"""
+        if self._redis is None or not entries:
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key, analysis_result in entries:
+                    pipe.set(key, orjson.dumps(analysis_result), ex=settings.LLM_CACHE_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("⚠️ LLM cache write failed: %s", e)
+    
+    async def analyze_company(self, scraped_data: Dict[str, Any], check_cache: bool = True) -> Dict[str, Any]:
         """
         Analyze scraped company data using LLM
+        (check_cache=False when the caller already looked this company up and missed)
         """
         # If API key or provider not configured, return a simple heuristic fallback
         if not getattr(self, 'api_key', None):
@@ -51,78 +246,161 @@ class LLMClient:
             products = homepage.get('important_lists', []) if isinstance(homepage.get('important_lists', None), list) else homepage.get('list_items', [])
 
             # Minimal analysis result matching expected schema
-            analysis_result = {
-                'company_name': scraped_data.get('company_name') or domain,
-                'description': (description[:300] + '...') if len(description) > 300 else description,
-                'industry': [],
-                'employee_size': 'unknown',
-                'founded_year': None,
-                'headquarters': 'unknown',
-                'revenue_range': 'unknown',
-                'business_model': 'Other',
-                'target_market': [],
-                'products_services': products[:10] if isinstance(products, list) else [],
-                'technology_stack': [],
-                'certifications': [],
-                'key_clients': [],
-                'competitive_advantage': [],
-                'risks': [],
-                'opportunities': [],
-                'sentiment_score': 0.0,
-                'confidence_score': 0.0,
-                'tokens_used': 0
-            }
+            analysis_result = _FALLBACK_TEMPLATE.copy()
+            analysis_result['company_name'] = scraped_data.get('company_name') or domain
+            analysis_result['description'] = (description[:300] + '...') if len(description) > 300 else description
+            if isinstance(products, list):
+                analysis_result['products_services'] = products[:10]
 
             return analysis_result
 
         # Prepare optimized prompt with token management
         prompt = self._prepare_analysis_prompt(scraped_data)
-        
-        messages = [
-            {
-                "role": "system",
-                "content": """You are a company intelligence analyst. Extract and analyze structured information 
-                from scraped company data. Be concise, accurate, and focus on key business insights."""
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
+        cache_key = self._cache_key(prompt)
+        if check_cache:
+            cached = await self._cache_get(cache_key)
+            if cached is not None:
+                return cached
         
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "temperature": 0.1,
-                        "max_tokens": 2000,
-                        "response_format": {"type": "json_object"}
-                    }
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    content = result["choices"][0]["message"]["content"]
-                    tokens_used = result.get("usage", {}).get("total_tokens", 0)
-                    
-                    # Parse JSON response
-                    analysis_result = json.loads(content)
-                    analysis_result["tokens_used"] = tokens_used
-                    
-                    return analysis_result
-                else:
-                    raise Exception(f"LLM API error: {response.status_code} - {response.text}")
-                    
+            analysis_result, tokens_used = await self._complete_json(
+                prompt, schema=("company_analysis", COMPANY_SCHEMA)
+            )
+            analysis_result["tokens_used"] = tokens_used
+            await self._cache_set(cache_key, analysis_result)
+            return analysis_result
         except Exception as e:
             raise Exception(f"LLM analysis failed: {str(e)}")
-    
+
+    async def analyze_company_batch(self, companies: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Analyze several companies with one LLM call.
+        Returns one entry per input, in order: the analysis dict, or the exception
+        for that company if the per-company fallback also failed.
+        """
+        if len(companies) < 2 or not getattr(self, 'api_key', None):
+            return await asyncio.gather(*(self.analyze_company(c) for c in companies), return_exceptions=True)
+
+        # Cache entries are per company (keyed by its single-company prompt), so only misses are batched
+        keys = [self._cache_key(self._prepare_analysis_prompt(c)) for c in companies]
+        results: List[Any] = await self._cache_get_many(keys)
+        misses = [i for i, r in enumerate(results) if r is None]
+        if not misses:
+            return results
+
+        batch = [companies[i] for i in misses]
+        try:
+            parsed, tokens_used = await self._complete_json(
+                self._prepare_batch_prompt(batch), max_tokens=2000 * len(batch),
+                schema=("company_analysis_batch", COMPANY_BATCH_SCHEMA)
+            )
+            items = parsed.get("companies") if isinstance(parsed, dict) else None
+        except Exception:
+            items = None
+
+        # Match replies to companies by their echoed id (1-based position in the batch);
+        # ids that are missing, out of range or repeated leave that company unmatched
+        by_id: Dict[int, Dict[str, Any]] = {}
+        repeated = set()
+        for item in items if isinstance(items, list) else ():
+            item_id = item.pop("id", None) if isinstance(item, dict) else None
+            if type(item_id) is not int or not 1 <= item_id <= len(batch):
+                continue
+            if item_id in by_id:
+                repeated.add(item_id)
+            by_id[item_id] = item
+        for item_id in repeated:
+            del by_id[item_id]
+
+        unmatched = []
+        matched = []
+        if by_id:
+            # Usage is reported per call; split it so every result still counts as an LLM analysis
+            share = max(1, tokens_used // len(by_id))
+        for n, i in enumerate(misses, 1):
+            item = by_id.get(n)
+            if item is None:
+                unmatched.append(i)
+                continue
+            item["tokens_used"] = share
+            results[i] = item
+            matched.append((keys[i], item))
+        # Only replies matched to their company by id are cached
+        await self._cache_set_many(matched)
+
+        if unmatched:
+            # Companies without a usable reply: one call each (already counted as cache misses above)
+            singles = await asyncio.gather(
+                *(self.analyze_company(companies[i], check_cache=False) for i in unmatched), return_exceptions=True
+            )
+            for i, result in zip(unmatched, singles):
+                results[i] = result
+        return results
+
+    async def _complete_json(self, prompt: str, max_tokens: int = 2000, schema: Optional[tuple] = None):
+        """
+        Run a JSON-mode chat completion; returns (parsed content, total tokens).
+        `schema` is a (name, JSON Schema) pair, enforced by providers with structured output.
+        """
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+        if schema and self.supports_json_schema:
+            name, json_schema = schema
+            response_format = {"type": "json_schema", "json_schema": {"name": name, "schema": json_schema, "strict": True}}
+        else:
+            response_format = {"type": "json_object"}
+
+        # Not streamed: Groq's JSON mode doesn't support streaming, and the reply is only
+        # parsed once it is complete anyway
+        response = await self._client.post(
+            "/chat/completions",
+            json={
+                "model": self.model,
+                "messages": messages,
+                "temperature": 0.1,
+                "max_tokens": max_tokens,
+                "response_format": response_format
+            }
+        )
+        if response.status_code != 200:
+            raise Exception(f"LLM API error: {response.status_code} - {response.text}")
+
+        result = orjson.loads(response.content)
+        content = result["choices"][0]["message"]["content"]
+        return orjson.loads(content), result.get("usage", {}).get("total_tokens", 0)
+
     def _prepare_analysis_prompt(self, scraped_data: Dict[str, Any]) -> str:
         """Prepare optimized prompt for analysis"""
         
+        prompt = f"""Analyze this company data and return ONLY the JSON object described in the instructions.
+
+{self._company_context(scraped_data)}"""
+        
+        return prompt
+
+    def _prepare_batch_prompt(self, companies: List[Dict[str, Any]]) -> str:
+        """Prepare one prompt covering several companies; each reply item echoes its company's id"""
+        n = len(companies)
+        sections = "\n\n".join(
+            f"--- Company id {i} of {n} ---\n{self._company_context(c)}" for i, c in enumerate(companies, 1)
+        )
+
+        return f"""Analyze the following {n} companies and return ONLY a JSON object of the form
+{{"companies": [...]}} where the array holds exactly {n} objects as described in the instructions,
+one per company, each with an extra integer field "id" set to that company's id.
+
+{sections}"""
+
+    def estimate_prompt_tokens(self, scraped_data: Dict[str, Any]) -> int:
+        """Tokens this company's content adds to a (batched) prompt"""
+        return TokenOptimizer.estimate_tokens(self._company_context(scraped_data))
+
+    def _company_context(self, scraped_data: Dict[str, Any]) -> str:
+        """Company header plus optimized page summaries for a prompt"""
+        
         # Extract key content (token optimization)
         company_name = scraped_data.get('company_name', 'Unknown')
         domain = scraped_data.get('domain', '')
@@ -130,51 +408,19 @@ class LLMClient:
         # Get page summaries (optimized)
         page_summaries = {}
         for page_type, content in scraped_data.get('pages_content', {}).items():
-            page_summaries[page_type] = {
-                'title': content.get('title', '')[:100],
+            summary = {
+                'title': (content.get('title') or '')[:100],
                 'key_headings': content.get('headings', {}).get('h1', [])[:3] + 
                                content.get('headings', {}).get('h2', [])[:5],
                 'key_paragraphs': content.get('paragraphs', [])[:3],
                 'list_items': content.get('list_items', [])[:10]
             }
+            # Empty fields cost tokens and tell the model nothing
+            page_summaries[page_type] = {k: v for k, v in summary.items() if v}
         
-        prompt = f"""Analyze this company data and return ONLY a JSON object with the structure below.
-
-Company: {company_name}
+        # Compact JSON: indentation is pure token overhead for the model
+        return f"""Company: {company_name}
 Domain: {domain}
 
 Content from website pages:
-{json.dumps(page_summaries, indent=2, ensure_ascii=False)}
-
-Extract the following information:
-
-{{
-  "company_name": "Full company name (if available, otherwise use domain)",
-  "description": "Brief company description (1-2 sentences max)",
-  "industry": ["primary industry", "secondary industry (if clear)"],
-  "employee_size": "Estimate: 1-10, 11-50, 51-200, 201-500, 501-1000, 1000+, unknown",
-  "founded_year": "Year or unknown",
-  "headquarters": "City, Country or unknown",
-  "revenue_range": "Estimate: <$1M, $1M-$10M, $10M-$50M, $50M-$100M, $100M-$500M, $500M-$1B, $1B+, unknown",
-  "business_model": "SaaS, Marketplace, E-commerce, Consulting, Services, Product, Other",
-  "target_market": ["B2B", "B2C", "Both"],
-  "products_services": ["List main products/services (max 10)"],
-  "technology_stack": ["Technologies mentioned (max 8)"],
-  "certifications": ["ISO, SOC, HIPAA, etc if mentioned"],
-  "key_clients": ["Mentioned clients or partners (max 5)"],
-  "competitive_advantage": ["Key differentiators (max 3)"],
-  "risks": ["Potential risks/weaknesses (max 3)"],
-  "opportunities": ["Growth opportunities (max 3)"],
-  "sentiment_score": "Number from -1 (negative) to 1 (positive)",
-  "confidence_score": "Number from 0 (low) to 1 (high) based on data availability"
-}}
-
-Rules:
-1. Only include information you can find in the provided content
-2. Use "unknown" if information is not available
-3. Be conservative with confidence_score
-4. Return ONLY valid JSON, no other text
-5. Keep arrays concise (max items as specified)
-6. Sentiment: analyze tone of content (positive/neutral/negative)"""
-        
-        return prompt
\ No newline at end of file
+{orjson.dumps(page_summaries).decode()}"""
@@ -0,0 +1,11 @@
+"""
+Shared Redis connection (None unless redis is installed and REDIS_URL is set)
+"""
+from app.config import settings
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+redis_client = aioredis.from_url(settings.REDIS_URL) if aioredis and settings.REDIS_URL else None
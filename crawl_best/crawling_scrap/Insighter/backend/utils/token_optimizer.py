@@ -1,10 +1,48 @@
 """
 Token optimization utilities
 """
+import asyncio
+import logging
 import re
 from typing import List, Dict, Any
 from collections import defaultdict
 
+from app.config import settings
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Compiled once for compress_text
+_WS = re.compile(r'\s+')
+# HTML tags, entities and control whitespace, in one alternation
+_ARTIFACTS = re.compile(r'<[^>]+>|&[a-z]+;|\s*[\n\r\t]+\s*')
+_SENT = re.compile(r'[.!?]+')
+
+logger = logging.getLogger("insighter.tokens")
+
+# Loaded by warm_tokenizer() at startup; estimates fall back to len(text) // 4 until then
+_ENCODING = None
+
+def _load_encoding():
+    """BPE encoding for the configured model; cl100k_base for models tiktoken doesn't know (Groq)"""
+    global _ENCODING
+    if _ENCODING is None and tiktoken is not None:
+        # Only a successful load is kept, so a failed download is retried on the next call
+        try:
+            try:
+                _ENCODING = tiktoken.encoding_for_model(settings.LLM_MODEL)
+            except KeyError:
+                _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning("⚠️ Tokenizer unavailable, estimating tokens from length: %s", e)
+    return _ENCODING
+
+async def warm_tokenizer():
+    """Loads the encoding in a worker thread; tiktoken may have to download the BPE file"""
+    await asyncio.to_thread(_load_encoding)
+
 class TokenOptimizer:
     """Optimize content to reduce token usage"""
     
@@ -15,21 +53,15 @@ class TokenOptimizer:
             return text
         
         # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
+        text = _WS.sub(' ', text)
         
         # Remove common HTML artifacts
-        artifacts = [
-            r'<[^>]+>',
-            r'&[a-z]+;',
-            r'\s*[\n\r\t]+\s*',
-        ]
-        for pattern in artifacts:
-            text = re.sub(pattern, ' ', text)
+        text = _ARTIFACTS.sub(' ', text)
         
         # If still too long, truncate intelligently
         if len(text) > max_length:
             # Try to find sentence boundaries
-            sentences = re.split(r'[.!?]+', text)
+            sentences = _SENT.split(text)
             compressed = []
             current_length = 0
             
@@ -66,21 +98,22 @@ class TokenOptimizer:
         optimized_pages = {}
         
         for page_type, content in pages_content.items():
+            # One lookup per nested dict instead of rebuilding empty defaults per field
+            headings = content.get('headings') or {}
+            specific = content.get('specific_data') or {}
+            paragraphs = content.get('paragraphs') or ()
+            
             # Extract only key elements
             optimized_pages[page_type] = {
                 'title': content.get('title', '')[:150],
                 'headings': {
-                    'h1': content.get('headings', {}).get('h1', [])[:3],
-                    'h2': content.get('headings', {}).get('h2', [])[:5],
-                    'h3': content.get('headings', {}).get('h3', [])[:5],
+                    'h1': (headings.get('h1') or [])[:3],
+                    'h2': (headings.get('h2') or [])[:5],
+                    'h3': (headings.get('h3') or [])[:5],
                 },
-                'key_paragraphs': [
-                    p[:300] for p in content.get('paragraphs', [])[:5]
-                    if len(p.strip()) > 50
-                ],
-                'important_lists': content.get('list_items', [])[:15],
-                'has_contact': bool(content.get('specific_data', {}).get('emails') or 
-                                   content.get('specific_data', {}).get('phones'))
+                'key_paragraphs': [p[:300] for p in paragraphs[:5] if len(p.strip()) > 50],
+                'important_lists': (content.get('list_items') or [])[:15],
+                'has_contact': bool(specific.get('emails') or specific.get('phones'))
             }
         
         optimized['pages_content'] = optimized_pages
@@ -93,6 +126,8 @@ class TokenOptimizer:
     
     @staticmethod
     def estimate_tokens(text: str) -> int:
-        """Rough token estimation"""
+        """Token count with tiktoken once loaded; rough estimate otherwise"""
+        if _ENCODING is not None:
+            return len(_ENCODING.encode(text, disallowed_special=()))
         # Simple approximation: 1 token ≈ 4 characters
         return len(text) // 4
\ No newline at end of file
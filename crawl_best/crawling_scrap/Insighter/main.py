@@ -10,10 +10,15 @@ import uvicorn
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
 
 if __name__ == "__main__":
+    from app.config import settings, UVICORN_LOOP, UVICORN_HTTP
+
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        loop=UVICORN_LOOP,
+        http=UVICORN_HTTP,
+        reload=settings.DEBUG,
+        workers=1 if settings.DEBUG else settings.WORKERS,
         log_level="info"
     )
\ No newline at end of file
@@ -20,6 +20,7 @@ from scrapy.linkextractors import LinkExtractor
 from scrapy_playwright.page import PageMethod
 import json
 import re
+import sys
 from urllib.parse import urlparse, urljoin
 from datetime import datetime
 import google.generativeai as genai
@@ -28,6 +29,7 @@ from collections import defaultdict
 
 # New lightweight FastAPI interface for direct endpoint usage
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import requests
 from bs4 import BeautifulSoup
@@ -570,8 +572,15 @@ class JsonExportPipeline:
         # Write to file
         final_data = list(companies.values())
         
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(final_data, f, indent=2, ensure_ascii=False)
+        if self.file_path == '-':
+            # NDJSON on the real stdout, one company per line, for a parent process to stream
+            out = sys.__stdout__.buffer
+            for company in final_data:
+                out.write(json.dumps(company, ensure_ascii=False).encode('utf-8') + b'\n')
+            out.flush()
+        else:
+            with open(self.file_path, 'w', encoding='utf-8') as f:
+                json.dump(final_data, f, indent=2, ensure_ascii=False)
         
         # Print summary
         successful = sum(1 for c in final_data if not c.get('error'))
@@ -597,7 +606,7 @@ def run_intelligent_crawler(company_urls, output_file=None, use_gemini=True):
     
     Args:
         company_urls: List of company websites
-        output_file: Output JSON file path
+        output_file: Output JSON file path, or '-' for NDJSON on stdout
         use_gemini: Whether to use Gemini AI for extraction
     
     Returns:
@@ -627,10 +636,45 @@ if __name__ == '__main__':
 
     app = FastAPI(title="Crawler Quick API")
 
+    class CompressExceptNDJSON:
+        """Runs `compressor` middleware, except for NDJSON responses, which go out uncompressed
+        so stream=True results still reach the client line by line"""
+
+        def __init__(self, app, compressor, **options):
+            self.app = app
+            self.compressed = compressor(self._route_response, **options)
+
+        async def __call__(self, scope, receive, send):
+            if scope['type'] != 'http':
+                await self.app(scope, receive, send)
+                return
+            await self.compressed({**scope, 'raw_send': send}, receive, send)
+
+        async def _route_response(self, scope, receive, compress_send):
+            target = compress_send
+
+            async def route(message):
+                nonlocal target
+                if message['type'] == 'http.response.start':
+                    headers = dict(message.get('headers') or ())
+                    if headers.get(b'content-type', b'').startswith(b'application/x-ndjson'):
+                        target = scope['raw_send']
+                await target(message)
+
+            await self.app(scope, receive, route)
+
+    # Scraped text is highly repetitive; compress responses (Brotli when available)
+    try:
+        from brotli_asgi import BrotliMiddleware as Compressor
+    except ImportError:
+        from fastapi.middleware.gzip import GZipMiddleware as Compressor
+    app.add_middleware(CompressExceptNDJSON, compressor=Compressor, minimum_size=1000)
+
     class ScrapeRequest(BaseModel):
         urls: list[str]
         timeout: int | None = 10
         max_workers: int | None = 4
+        stream: bool = False  # NDJSON: one result per line, flushed as each URL finishes
 
     def scrape_single(url: str, timeout: int = 10) -> dict:
         """Basic scraping using requests + BeautifulSoup. Returns a structured dict."""
@@ -703,29 +747,46 @@ if __name__ == '__main__':
         results = []
         start = time.time()
 
-        with ThreadPoolExecutor(max_workers=request.max_workers or 4) as ex:
-            futures = {ex.submit(scrape_single, url, request.timeout or 10): url for url in request.urls}
-            for fut in as_completed(futures):
-                try:
-                    results.append(fut.result())
-                except Exception as e:
-                    results.append({'url': futures[fut], 'error': str(e)})
-
-        # Save results to output folder as JSON
-        try:
-            out_dir = os.path.join(os.path.dirname(__file__), 'output')
-            os.makedirs(out_dir, exist_ok=True)
-            out_file = os.path.join(out_dir, f"scrape_{int(time.time())}.json")
-            with open(out_file, 'w', encoding='utf-8') as f:
-                json.dump({'took_seconds': round(time.time() - start, 2), 'count': len(results), 'results': results}, f, ensure_ascii=False, indent=2)
-        except Exception:
+        def scrape_all():
+            with ThreadPoolExecutor(max_workers=request.max_workers or 4) as ex:
+                futures = {ex.submit(scrape_single, url, request.timeout or 10): url for url in request.urls}
+                for fut in as_completed(futures):
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        result = {'url': futures[fut], 'error': str(e)}
+                    results.append(result)
+                    yield result
+
+        def save_results():
+            # Save results to output folder as JSON
+            try:
+                out_dir = os.path.join(os.path.dirname(__file__), 'output')
+                os.makedirs(out_dir, exist_ok=True)
+                out_file = os.path.join(out_dir, f"scrape_{int(time.time())}.json")
+                with open(out_file, 'w', encoding='utf-8') as f:
+                    json.dump({'took_seconds': round(time.time() - start, 2), 'count': len(results), 'results': results}, f, ensure_ascii=False, indent=2)
+                return out_file
+            except Exception:
+                return None
+
+        if request.stream:
+            def ndjson_lines():
+                for result in scrape_all():
+                    yield json.dumps(result, ensure_ascii=False) + '\n'
+                save_results()
+
+            return StreamingResponse(ndjson_lines(), media_type='application/x-ndjson')
+
+        for _ in scrape_all():
             pass
+        out_file = save_results()
 
         return {
             'took_seconds': round(time.time() - start, 2),
             'count': len(results),
             'results': results,
-            'saved_to': out_file if 'out_file' in locals() else None
+            'saved_to': out_file
         }
 
 
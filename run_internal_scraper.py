@@ -3,6 +3,10 @@ import os
 import json
 import asyncio
 
+# With '-' as the output target, stdout carries NDJSON results only; send all chatter to stderr
+if len(sys.argv) > 1 and sys.argv[1] == '-':
+    sys.stdout = sys.stderr
+
 # Add the crawler directory to path
 current_dir = os.getcwd()
 crawler_dir = os.path.join(current_dir, 'crawl_best', 'crawling_scrap', 'crawler')
@@ -18,7 +22,7 @@ except ImportError:
 
 def main():
     if len(sys.argv) < 3:
-        print("Usage: python run_internal_scraper.py <output_file> <url1> [url2 ...]")
+        print("Usage: python run_internal_scraper.py <output_file|-> <url1> [url2 ...]")
         sys.exit(1)
         
     output_file = sys.argv[1]